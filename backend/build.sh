@@ -15,4 +15,10 @@ python manage.py makemigrations
 python manage.py migrate
 
 # Create superuser
-python manage.py createsu
\ No newline at end of file
+python manage.py createsu
+
+# Fill in stored image URLs for rows saved before they existed
+python manage.py refresh_image_urls --missing
+
+# Backfill the revenue rollups behind the admin charts
+python manage.py rebuild_revenue_rollups --missing
@@ -2,7 +2,7 @@ from django.contrib import admin
 
 # Register your models here.
 
-from .models import Car, Feature, CarImage, Brand, Booking, Review, Wishlist, ContactMessage, Newsletter
+from .models import Car, Feature, CarImage, Brand, Booking, Review, Wishlist, ContactMessage, Newsletter, EmailOutbox, NewsletterCampaign, StripeEvent, RevenueRollup
 
 @admin.register(Car)
 class CarAdmin(admin.ModelAdmin):
@@ -44,4 +44,33 @@ class ContactMessageAdmin(admin.ModelAdmin):
 class NewsletterAdmin(admin.ModelAdmin):
     list_display = ['email', 'subscribed_at', 'is_active']
     list_filter = ['is_active', 'subscribed_at']
-    search_fields = ['email']
\ No newline at end of file
+    search_fields = ['email']
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ['recipient', 'subject', 'status', 'attempts', 'created_at', 'sent_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['recipient', 'subject']
+    readonly_fields = ['created_at', 'sent_at', 'last_error']
+
+
+@admin.register(NewsletterCampaign)
+class NewsletterCampaignAdmin(admin.ModelAdmin):
+    # Sent with: python manage.py send_newsletter <id>
+    list_display = ['subject', 'status', 'sent_count', 'failed_count', 'created_at', 'finished_at']
+    list_filter = ['status']
+    readonly_fields = ['status', 'last_subscriber_id', 'sent_count', 'failed_count', 'started_at', 'finished_at']
+
+
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    list_display = ['event_id', 'type', 'booking', 'received_at']
+    list_filter = ['type']
+    search_fields = ['event_id']
+
+
+@admin.register(RevenueRollup)
+class RevenueRollupAdmin(admin.ModelAdmin):
+    list_display = ['period', 'bucket', 'car', 'revenue', 'bookings']
+    list_filter = ['period']
+    readonly_fields = ['period', 'bucket', 'car', 'revenue', 'bookings']
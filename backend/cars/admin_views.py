@@ -1,119 +1,86 @@
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
-from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework import generics, status
 from django.contrib.auth.models import User
-from django.db.models import Count, Sum, Q, Avg
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.db.models import Count, Sum, Q
 from django.utils import timezone
 from datetime import timedelta
-from .models import Car, Booking, Review, Brand
-from .serializers import BookingSerializer, CarSerializer
+from .models import Booking
+from .serializers import AdminBookingSerializer, BookingSerializer
+from .pagination import KeysetPagination
+from .bookings import reserve_dates, save_or_conflict
+from .availability import parse_date, start_of_day
+from .fleet_calendar import fleet_calendar, ENCODINGS
+from .stripe_client import stripe_latency
+from .dashboard import get_admin_stats
+from .revenue import revenue_series, PERIODS, GROUPINGS
+from .exports import export_lines, EXPORTS, FORMATS
+from .fleet_import import import_fleet, parse_fleet_file, FILE_FORMATS
+
+
+ADMIN_BOOKING_FIELDS = (
+    'id', 'user', 'car', 'pickup_date', 'return_date', 'total_days',
+    'total_cost', 'status', 'payment_status', 'created_at',
+)
+# created_at is compared against the bounds of the local day, which keeps
+# the lookup on the index; created_at__date would not
+DATE_FILTERS = {
+    'pickup_from': ('pickup_date__gte', lambda day: day),
+    'pickup_to': ('pickup_date__lte', lambda day: day),
+    'created_from': ('created_at__gte', start_of_day),
+    'created_to': ('created_at__lt', lambda day: start_of_day(day + timedelta(days=1))),
+}
+
+# 13 weeks covers a 90-day window
+MAX_FLEET_CALENDAR_WEEKS = 13
 
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
 def admin_stats(request):
     """Get dashboard statistics for admin"""
-    
-    # Total counts
-    total_cars = Car.objects.count()
-    total_users = User.objects.filter(is_staff=False).count()
-    total_bookings = Booking.objects.count()
-    total_revenue = Booking.objects.filter(
-        payment_status='succeeded'
-    ).aggregate(total=Sum('total_cost'))['total'] or 0
-    
-    # Active bookings (confirmed and not yet completed)
-    active_bookings = Booking.objects.filter(
-        status__in=['pending', 'confirmed'],
-        return_date__gte=timezone.now().date()
-    ).count()
-    
-    # Recent bookings (last 30 days)
-    thirty_days_ago = timezone.now() - timedelta(days=30)
-    recent_bookings = Booking.objects.filter(
-        created_at__gte=thirty_days_ago
-    ).count()
-    
-    # Revenue this month
-    first_day_of_month = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    monthly_revenue = Booking.objects.filter(
-        payment_status='succeeded',
-        created_at__gte=first_day_of_month
-    ).aggregate(total=Sum('total_cost'))['total'] or 0
-    
-    # Most popular cars
-    popular_cars = Car.objects.annotate(
-        booking_count=Count('bookings')
-    ).order_by('-booking_count')[:5]
-    
-    popular_cars_data = [{
-        'id': car.id,
-        'name': car.name,
-        'bookings': car.booking_count,
-        'revenue': Booking.objects.filter(
-            car=car, 
-            payment_status='succeeded'
-        ).aggregate(total=Sum('total_cost'))['total'] or 0
-    } for car in popular_cars]
-    
-    # Booking status breakdown
-    status_breakdown = {
-        'pending': Booking.objects.filter(status='pending').count(),
-        'confirmed': Booking.objects.filter(status='confirmed').count(),
-        'cancelled': Booking.objects.filter(status='cancelled').count(),
-        'completed': Booking.objects.filter(status='completed').count(),
-    }
-    
-    # Recent reviews
-    recent_reviews = Review.objects.select_related('user', 'car').order_by('-created_at')[:5]
-    reviews_data = [{
-        'id': review.id,
-        'user': review.user.username,
-        'car': review.car.name,
-        'rating': review.rating,
-        'comment': review.comment[:100],
-        'created_at': review.created_at
-    } for review in recent_reviews]
-    
-    return Response({
-        'overview': {
-            'total_cars': total_cars,
-            'total_users': total_users,
-            'total_bookings': total_bookings,
-            'total_revenue': float(total_revenue),
-            'active_bookings': active_bookings,
-            'recent_bookings': recent_bookings,
-            'monthly_revenue': float(monthly_revenue)
-        },
-        'popular_cars': popular_cars_data,
-        'status_breakdown': status_breakdown,
-        'recent_reviews': reviews_data
-    })
+    return Response(get_admin_stats())
 
 
-@api_view(['GET'])
-@permission_classes([IsAdminUser])
-def admin_all_bookings(request):
-    """Get all bookings for admin with filters"""
-    
-    # Get query parameters for filtering
-    status_filter = request.query_params.get('status')
-    user_id = request.query_params.get('user_id')
-    car_id = request.query_params.get('car_id')
-    
-    bookings = Booking.objects.select_related('user', 'car').all()
-    
-    if status_filter:
-        bookings = bookings.filter(status=status_filter)
-    if user_id:
-        bookings = bookings.filter(user_id=user_id)
-    if car_id:
-        bookings = bookings.filter(car_id=car_id)
-    
-    bookings = bookings.order_by('-created_at')
+class AdminBookingPagination(KeysetPagination):
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class AdminBookingList(generics.ListAPIView):
+    """All bookings for admin with filters, a page at a time.
+
+    Filters: status, user_id, car_id, and inclusive date ranges on the
+    pickup date (pickup_from, pickup_to) and booking date (created_from,
+    created_to). Each page is one query, plus a COUNT in page-number mode.
+    """
+    serializer_class = AdminBookingSerializer
+    permission_classes = [IsAdminUser]
+    pagination_class = AdminBookingPagination
+    keyset_ordering = ('-created_at', '-id')
     
-    serializer = BookingSerializer(bookings, many=True)
-    return Response(serializer.data)
+    def get_queryset(self):
+        params = self.request.query_params
+        bookings = Booking.objects.select_related('user', 'car').only(
+            *ADMIN_BOOKING_FIELDS, 'user__username', 'car__name',
+        )
+        
+        filters = {}
+        if params.get('status'):
+            filters['status'] = params['status']
+        for name in ('user_id', 'car_id'):
+            if params.get(name):
+                if not params[name].isdigit():
+                    raise ValidationError({name: f'{name} must be an integer'})
+                filters[name] = params[name]
+        for name, (lookup, bound) in DATE_FILTERS.items():
+            if params.get(name):
+                filters[lookup] = bound(parse_date(name, params[name]))
+        
+        return bookings.filter(**filters).order_by(*self.keyset_ordering)
 
 
 @api_view(['PATCH'])
@@ -129,8 +96,12 @@ def admin_update_booking_status(request, booking_id):
                 'error': 'Invalid status'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        booking.status = new_status
-        booking.save()
+        with transaction.atomic():
+            if new_status in Booking.ACTIVE_STATUSES and booking.status not in Booking.ACTIVE_STATUSES:
+                # Reactivating a booking: its dates may have been taken since
+                reserve_dates(booking.car_id, booking.pickup_date, booking.return_date, exclude=booking.pk)
+            booking.status = new_status
+            save_or_conflict(booking.save)
         
         serializer = BookingSerializer(booking)
         return Response(serializer.data)
@@ -169,32 +140,156 @@ def admin_all_users(request):
 @permission_classes([IsAdminUser])
 def admin_revenue_chart(request):
     """Get revenue data for charts (last 12 months)"""
-    from datetime import datetime
     from dateutil.relativedelta import relativedelta
     
-    today = timezone.now().date()
-    twelve_months_ago = today - relativedelta(months=12)
-    
-    # Get monthly revenue
-    bookings = Booking.objects.filter(
-        payment_status='succeeded',
-        created_at__gte=twelve_months_ago
-    )
+    this_month = timezone.localdate().replace(day=1)
+    first_month = this_month - relativedelta(months=11)
     
-    monthly_data = {}
-    for i in range(12):
-        month_date = today - relativedelta(months=i)
-        month_key = month_date.strftime('%Y-%m')
-        month_bookings = bookings.filter(
-            created_at__year=month_date.year,
-            created_at__month=month_date.month
-        )
-        monthly_data[month_key] = {
-            'revenue': float(month_bookings.aggregate(total=Sum('total_cost'))['total'] or 0),
-            'bookings': month_bookings.count()
+    # Months without paid bookings have no rollups
+    monthly_data = {
+        (first_month + relativedelta(months=i)).strftime('%Y-%m'): {'revenue': 0.0, 'bookings': 0}
+        for i in range(12)
+    }
+    for row in revenue_series(first_month, this_month):
+        monthly_data[row['bucket'].strftime('%Y-%m')] = {
+            'revenue': float(row['revenue']),
+            'bookings': row['bookings']
         }
     
-    # Sort by date
-    sorted_data = dict(sorted(monthly_data.items()))
+    return Response(monthly_data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def admin_revenue_breakdown(request):
+    """Revenue per day or month over any date range, optionally per car or brand (admin only)"""
+    # GET /api/admin/revenue/breakdown/?start=2026-01-01&end=2026-06-30&period=month&by=brand
+    # Both ends are inclusive
+    start = parse_date('start', request.query_params.get('start'))
+    end = parse_date('end', request.query_params.get('end'))
+    period = request.query_params.get('period', 'month')
+    by = request.query_params.get('by') or None
+    
+    if period not in PERIODS:
+        return Response({
+            'error': f'period must be one of {", ".join(PERIODS)}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if end < start:
+        return Response({
+            'error': 'end must not be before start'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if by is not None and by not in GROUPINGS:
+        return Response({
+            'error': f'by must be one of {", ".join(GROUPINGS)}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    if period == 'month':
+        # Month buckets are keyed by their first day
+        start = start.replace(day=1)
+    rows = revenue_series(start, end, period, by)
+    for row in rows:
+        row['revenue'] = float(row['revenue'])
+    return Response(rows)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def admin_fleet_calendar(request):
+    """Cars x days occupancy grid for the next N weeks (admin only)"""
+    # GET /api/admin/fleet-calendar/?start=2026-06-01&weeks=4&encoding=rle
+    start = request.query_params.get('start')
+    start = parse_date('start', start) if start else timezone.localdate()
+    encoding = request.query_params.get('encoding', 'rle')
+    try:
+        weeks = int(request.query_params.get('weeks', 4))
+    except ValueError:
+        weeks = 0
+    
+    if not 1 <= weeks <= MAX_FLEET_CALENDAR_WEEKS:
+        return Response({
+            'error': f'weeks must be between 1 and {MAX_FLEET_CALENDAR_WEEKS}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if encoding not in ENCODINGS:
+        return Response({
+            'error': f'encoding must be one of {", ".join(ENCODINGS)}'
+        }, status=status.HTTP_400_BAD_REQUEST)
     
-    return Response(sorted_data)
\ No newline at end of file
+    return Response(fleet_calendar(start, weeks * 7, encoding))
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def admin_stripe_latency(request):
+    """Recent Stripe API latency for the worker serving this request (admin only)"""
+    return Response(stripe_latency())
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def admin_export(request, kind):
+    """Stream a table as CSV or NDJSON (admin only)"""
+    # GET /api/admin/export/bookings/?output=ndjson&fields=id,status&start=2026-01-01&end=2026-03-31
+    if kind not in EXPORTS:
+        return Response({
+            'error': f'Unknown export. Choose one of {", ".join(EXPORTS)}'
+        }, status=status.HTTP_404_NOT_FOUND)
+    columns = EXPORTS[kind].columns
+    output = request.query_params.get('output', 'csv')
+    fields = [name.strip() for name in request.query_params.get('fields', '').split(',') if name.strip()]
+    fields = fields or list(columns)
+    
+    if output not in FORMATS:
+        return Response({
+            'error': f'output must be one of {", ".join(FORMATS)}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    unknown = [name for name in fields if name not in columns]
+    if unknown:
+        return Response({
+            'error': f'Unknown fields: {", ".join(unknown)}. Available: {", ".join(columns)}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    start = request.query_params.get('start')
+    end = request.query_params.get('end')
+    start = parse_date('start', start) if start else None
+    end = parse_date('end', end) if end else None
+    if start and end and end < start:
+        return Response({
+            'error': 'end must not be before start'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    response = StreamingHttpResponse(
+        export_lines(kind, output, fields, start, end), content_type=FORMATS[output],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{kind}-{timezone.localdate()}.{output}"'
+    return response
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def admin_import_fleet(request):
+    """Bulk-create cars from an uploaded CSV/JSON file or a JSON array body (admin only)"""
+    # POST /api/admin/cars/import/?dry_run=true with a multipart `file`
+    dry_run = request.query_params.get('dry_run', '').lower() in ('1', 'true', 'yes')
+    upload = request.FILES.get('file')
+    
+    if upload is not None:
+        file_format = upload.name.rsplit('.', 1)[-1].lower()
+        if file_format not in FILE_FORMATS:
+            return Response({
+                'error': f'file must be one of {", ".join(FILE_FORMATS)}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            text = upload.read().decode('utf-8-sig')
+        except UnicodeDecodeError:
+            return Response({'error': 'file must be UTF-8'}, status=status.HTTP_400_BAD_REQUEST)
+        records = parse_fleet_file(text, file_format)
+    elif isinstance(request.data, list):
+        records = request.data
+    else:
+        return Response({
+            'error': 'Upload a file or send a JSON array of cars'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    summary = import_fleet(records, dry_run=dry_run)
+    return Response(
+        {'dry_run': dry_run, **summary},
+        status=status.HTTP_200_OK if dry_run else status.HTTP_201_CREATED,
+    )
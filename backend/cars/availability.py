@@ -0,0 +1,61 @@
+from datetime import datetime, time
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from .models import Booking
+from . import availability_index
+
+
+def parse_date(name, value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ValidationError({name: 'Invalid date format. Use YYYY-MM-DD'})
+
+
+def start_of_day(day):
+    """Midnight at the start of day in the current time zone"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def parse_date_range(params, start_name='available_from', end_name='available_to', required=False):
+    """(start, end) from query parameters, or (None, None) when both are absent"""
+    start, end = params.get(start_name), params.get(end_name)
+    if not start and not end and not required:
+        return None, None
+    if not start or not end:
+        raise ValidationError({'error': f'Both {start_name} and {end_name} are required'})
+
+    start, end = parse_date(start_name, start), parse_date(end_name, end)
+    if end <= start:
+        raise ValidationError({end_name: f'{end_name} must be after {start_name}'})
+    return start, end
+
+
+def overlapping_bookings(pickup, return_date):
+    """Active bookings that overlap [pickup, return_date).
+
+    A booking overlaps if it starts before our return date and ends after
+    our pickup date, so a car returned on a given day can be picked up
+    again that same day.
+    """
+    return Booking.objects.filter(
+        status__in=Booking.ACTIVE_STATUSES,
+        pickup_date__lt=return_date,
+        return_date__gt=pickup,
+    )
+
+
+def available_cars(queryset, pickup, return_date):
+    """Cars in queryset with no active booking overlapping the range.
+
+    A single NOT EXISTS anti-join, served by the partial index on active
+    bookings (car, pickup_date, return_date). With the availability index
+    on, the cars matching queryset's other filters are checked against the
+    day bitmaps and the free ones come back as an id IN (...) list.
+    """
+    if availability_index.index_enabled():
+        car_ids = list(queryset.order_by().values_list('id', flat=True))
+        return queryset.filter(pk__in=availability_index.free_car_ids(car_ids, pickup, return_date))
+    conflicts = overlapping_bookings(pickup, return_date).filter(car=OuterRef('pk'))
+    return queryset.filter(~Exists(conflicts))
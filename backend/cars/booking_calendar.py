@@ -0,0 +1,118 @@
+"""Booked intervals per car, cached one calendar month at a time.
+
+A month's entry holds the car's merged booked intervals clipped to that
+month, as [start, end) date pairs. The end is exclusive because a car
+returned on a given day can be picked up again that same day. A request
+for several months reads every entry in one cache round trip and fills
+the misses with a single range query.
+
+Booking signals (see cars.signals) drop only the months a booking's old
+and new dates touch. Bulk writes through queryset.update() send no
+signals and must call invalidate_calendar() themselves.
+"""
+from datetime import date, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+from .models import Booking
+
+CALENDAR_KEY = 'cars:calendar:{}:{:04d}-{:02d}'
+MAX_CALENDAR_MONTHS = 12
+
+
+def parse_month(value):
+    """First day of the YYYY-MM month in value"""
+    try:
+        year, month = value.split('-')
+        return date(int(year), int(month), 1)
+    except (AttributeError, ValueError):
+        raise ValidationError({'month': 'Invalid month format. Use YYYY-MM'})
+
+
+def next_month(day):
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def month_range(start, months):
+    """First days of the months months long window starting at start"""
+    days = [start]
+    for _ in range(months - 1):
+        days.append(next_month(days[-1]))
+    return days
+
+
+def months_spanned(pickup, return_date):
+    """First days of the months the booked days [pickup, return_date) fall in"""
+    if return_date <= pickup:
+        return []
+    month, last = pickup.replace(day=1), return_date - timedelta(days=1)
+    months = []
+    while month <= last:
+        months.append(month)
+        month = next_month(month)
+    return months
+
+
+def merge_intervals(intervals):
+    """Merge sorted [start, end) pairs that overlap or touch"""
+    merged = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(interval) for interval in merged]
+
+
+def clip(intervals, start, end):
+    return [(max(s, start), min(e, end)) for s, e in intervals if s < end and e > start]
+
+
+def booked_intervals(car_id, start, months=1):
+    """Merged booked [start, end) intervals for the car over the window"""
+    window = month_range(start, months)
+    keys = {month: _calendar_key(car_id, month) for month in window}
+    cached = cache.get_many(keys.values())
+
+    missing = [month for month in window if keys[month] not in cached]
+    if missing:
+        # One query over the span of the missing months
+        span_start, span_end = missing[0], next_month(missing[-1])
+        bookings = Booking.objects.filter(
+            car_id=car_id,
+            status__in=Booking.ACTIVE_STATUSES,
+            pickup_date__lt=span_end,
+            return_date__gt=span_start,
+        ).order_by('pickup_date').values_list('pickup_date', 'return_date')
+        merged = merge_intervals(bookings)
+
+        fresh = {keys[month]: clip(merged, month, next_month(month)) for month in missing}
+        cache.set_many(fresh, settings.CATALOG_CACHE_TIMEOUT)
+        cached.update(fresh)
+
+    # Intervals clipped at a month boundary join up again here
+    return merge_intervals(interval for month in window for interval in cached[keys[month]])
+
+
+def invalidate_calendar(car_id, *date_ranges):
+    """Drop the car's cached months touched by any (pickup, return_date) range.
+
+    Runs now and again after commit, like response_cache.invalidate().
+    """
+    keys = {
+        _calendar_key(car_id, month)
+        for pickup, return_date in date_ranges
+        for month in months_spanned(pickup, return_date)
+    }
+    if not keys:
+        return
+
+    def delete_months():
+        cache.delete_many(keys)
+    delete_months()
+    transaction.on_commit(delete_months)
+
+
+def _calendar_key(car_id, month):
+    return CALENDAR_KEY.format(car_id, month.year, month.month)
@@ -0,0 +1,76 @@
+"""Double-booking protection.
+
+Every write that makes a booking hold its car for a range goes through
+reserve_dates() inside a transaction:
+
+- The car row is locked with SELECT ... FOR UPDATE, so concurrent
+  reservations for the same car run their overlap check one at a time.
+  Reservations for different cars don't wait on each other.
+- SQLite has no row locks. There the dev settings open every transaction
+  with BEGIN IMMEDIATE, which takes the database write lock up front and
+  serializes writers the same way, only globally.
+- On PostgreSQL the booking_no_overlap exclusion constraint (migration
+  0025) rejects overlapping active bookings whatever path wrote them.
+"""
+from django.db import IntegrityError, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from .models import Booking, Car
+from .availability import overlapping_bookings
+
+EXCLUSION_CONSTRAINT = 'booking_no_overlap'
+
+
+class BookingConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Car is not available for selected dates'
+    default_code = 'booking_conflict'
+
+
+def reserve_dates(car_id, pickup, return_date, exclude=None):
+    """Lock the car and raise BookingConflict if the range is taken.
+
+    Must run inside transaction.atomic(); the lock is held until it ends.
+    """
+    if not Car.objects.select_for_update().filter(pk=car_id).exists():
+        raise ValidationError({'car_id': 'Car not found'})
+
+    conflicts = overlapping_bookings(pickup, return_date).filter(car_id=car_id)
+    if exclude is not None:
+        conflicts = conflicts.exclude(pk=exclude)
+    conflicting = conflicts.only('pickup_date', 'return_date').first()
+    if conflicting is not None:
+        raise BookingConflict({
+            'error': 'Car is not available for selected dates',
+            'conflicting_booking': {
+                'pickup_date': conflicting.pickup_date,
+                'return_date': conflicting.return_date,
+            },
+        })
+
+
+def save_booking(serializer, **kwargs):
+    """serializer.save() with the overlap check and insert in one transaction"""
+    booking, data = serializer.instance, serializer.validated_data
+
+    def current(field, default=None):
+        return data.get(field, getattr(booking, field, default))
+
+    with transaction.atomic():
+        if current('status', 'pending') in Booking.ACTIVE_STATUSES:
+            reserve_dates(
+                current('car_id'), current('pickup_date'), current('return_date'),
+                exclude=booking.pk if booking else None,
+            )
+        return save_or_conflict(serializer.save, **kwargs)
+
+
+def save_or_conflict(save, *args, **kwargs):
+    """Run save, turning an exclusion constraint violation into BookingConflict"""
+    try:
+        with transaction.atomic():
+            return save(*args, **kwargs)
+    except IntegrityError as error:
+        if EXCLUSION_CONSTRAINT in str(error):
+            raise BookingConflict()
+        raise
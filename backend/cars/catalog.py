@@ -0,0 +1,89 @@
+"""Catalog version stamp and conditional GET support.
+
+Any write to Car, Brand, Feature or CarImage (see cars.signals), and any
+change to the stored rating fields (see cars.ratings), bumps the single
+CatalogStamp row. Catalog endpoints use the stamp as their ETag and
+Last-Modified. A client revalidating with If-None-Match or
+If-Modified-Since gets a 304 after one primary-key lookup, before any
+serialization happens.
+"""
+from functools import wraps
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+from .models import CatalogStamp
+from .response_cache import cached_response
+
+STAMP_ID = 1
+
+
+def bump_catalog_version():
+    now = timezone.now()
+    updated = CatalogStamp.objects.filter(pk=STAMP_ID).update(version=F('version') + 1, updated_at=now)
+    if not updated:
+        CatalogStamp.objects.get_or_create(pk=STAMP_ID, defaults={'version': 1, 'updated_at': now})
+
+
+def get_catalog_stamp(request=None):
+    """Current stamp, looked up at most once per request"""
+    stamp = getattr(request, '_catalog_stamp', None)
+    if stamp is None:
+        stamp = CatalogStamp.objects.filter(pk=STAMP_ID).first()
+        if stamp is None:
+            stamp, _ = CatalogStamp.objects.get_or_create(
+                pk=STAMP_ID, defaults={'version': 0, 'updated_at': timezone.now()}
+            )
+        if request is not None:
+            request._catalog_stamp = stamp
+    return stamp
+
+
+def catalog_etag(request, *args, **kwargs):
+    return f'"catalog-{get_catalog_stamp(request).version}"'
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    return get_catalog_stamp(request).updated_at
+
+
+def catalog_conditional(view_func):
+    """Answer If-None-Match / If-Modified-Since from the catalog stamp.
+
+    Responses are marked no-cache so browsers revalidate every time
+    instead of guessing a freshness lifetime from Last-Modified.
+    """
+    conditional_view = condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)(view_func)
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        response = conditional_view(request, *args, **kwargs)
+        if request.method in ('GET', 'HEAD'):
+            patch_cache_control(response, no_cache=True)
+        return response
+    return wrapper
+
+
+class CatalogResponseMixin:
+    """Conditional GET and response caching for a catalog viewset's list and retrieve.
+
+    cache_scopes maps an action to the cars.response_cache scopes its
+    response depends on; actions without an entry are not cached.
+    Requests carrying any of volatile_params depend on more than the
+    catalog and bypass both the ETag and the cache.
+    """
+    cache_scopes = {}
+    volatile_params = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.catalog_response('list', super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.catalog_response('retrieve', super().retrieve, request, *args, **kwargs)
+
+    def catalog_response(self, action, handler, request, *args, **kwargs):
+        if any(param in request.query_params for param in self.volatile_params):
+            return handler(request, *args, **kwargs)
+        if action in self.cache_scopes:
+            handler = cached_response(*self.cache_scopes[action])(handler)
+        return catalog_conditional(handler)(request, *args, **kwargs)
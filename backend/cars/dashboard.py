@@ -0,0 +1,82 @@
+"""Admin dashboard statistics.
+
+compute_admin_stats() takes five queries whatever the table sizes: one
+conditional aggregate over bookings, the car and user counts, the top
+cars with their revenue, and the latest reviews.
+
+get_admin_stats() serves a snapshot cached under the 'admin-stats' scope
+of cars.response_cache. Booking and review signals (see cars.signals)
+invalidate it. New users and the day rolling over only show up once
+ADMIN_STATS_TIMEOUT passes.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from .models import Booking, Car, Review
+from .response_cache import get_generations
+
+SNAPSHOT_KEY = 'admin:stats:{}'
+
+
+def compute_admin_stats():
+    now = timezone.now()
+    thirty_days_ago = now - timedelta(days=30)
+    first_day_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    paid = Q(payment_status='succeeded')
+
+    bookings = Booking.objects.aggregate(
+        total_bookings=Count('id'),
+        total_revenue=Sum('total_cost', filter=paid),
+        # Active bookings (confirmed and not yet completed)
+        active_bookings=Count('id', filter=Q(status__in=Booking.ACTIVE_STATUSES, return_date__gte=now.date())),
+        recent_bookings=Count('id', filter=Q(created_at__gte=thirty_days_ago)),
+        monthly_revenue=Sum('total_cost', filter=paid & Q(created_at__gte=first_day_of_month)),
+        **{status: Count('id', filter=Q(status=status)) for status, _ in Booking.STATUS_CHOICES},
+    )
+
+    # Most popular cars
+    popular_cars = Car.objects.annotate(
+        booking_count=Count('bookings'),
+        revenue=Sum('bookings__total_cost', filter=Q(bookings__payment_status='succeeded')),
+    ).order_by('-booking_count', 'id').values('id', 'name', 'booking_count', 'revenue')[:5]
+
+    recent_reviews = Review.objects.select_related('user', 'car').order_by('-created_at')[:5]
+
+    return {
+        'overview': {
+            'total_cars': Car.objects.count(),
+            'total_users': User.objects.filter(is_staff=False).count(),
+            'total_bookings': bookings['total_bookings'],
+            'total_revenue': float(bookings['total_revenue'] or 0),
+            'active_bookings': bookings['active_bookings'],
+            'recent_bookings': bookings['recent_bookings'],
+            'monthly_revenue': float(bookings['monthly_revenue'] or 0)
+        },
+        'popular_cars': [{
+            'id': car['id'],
+            'name': car['name'],
+            'bookings': car['booking_count'],
+            'revenue': car['revenue'] or 0
+        } for car in popular_cars],
+        'status_breakdown': {status: bookings[status] for status, _ in Booking.STATUS_CHOICES},
+        'recent_reviews': [{
+            'id': review.id,
+            'user': review.user.username,
+            'car': review.car.name,
+            'rating': review.rating,
+            'comment': review.comment[:100],
+            'created_at': review.created_at
+        } for review in recent_reviews],
+    }
+
+
+def get_admin_stats():
+    key = SNAPSHOT_KEY.format(get_generations(['admin-stats'])[0])
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_admin_stats()
+        cache.set(key, stats, settings.ADMIN_STATS_TIMEOUT)
+    return stats
@@ -1,8 +1,17 @@
-from django.core.mail import send_mail
-from django.conf import settings
+from .models import EmailOutbox
+
+
+def queue_email(recipient, subject, message):
+    """Add an email to the outbox, in the caller's transaction.
+
+    The send_queued_emails worker delivers it once that commits, so
+    requests never wait on SMTP and rolled-back writes send nothing.
+    """
+    return EmailOutbox.objects.create(recipient=recipient, subject=subject, body=message)
+
 
 def send_booking_confirmation_email(booking):
-    """Send booking confirmation email to user"""
+    """Queue booking confirmation email to user"""
     subject = f'Booking Confirmation - {booking.car.name}'
     
     # Plain text message (no template)
@@ -26,22 +35,11 @@ def send_booking_confirmation_email(booking):
     The Autohire Team
     """
     
-    try:
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[booking.user.email],
-            fail_silently=True,  # Change to True to suppress errors
-        )
-        return True
-    except Exception as e:
-        print(f"Error sending email: {e}")
-        return False
+    return queue_email(booking.user.email, subject, message)
 
 
 def send_booking_cancellation_email(booking):
-    """Send booking cancellation email to user"""
+    """Queue booking cancellation email to user"""
     subject = f'Booking Cancelled - {booking.car.name}'
     
     message = f"""
@@ -64,22 +62,11 @@ def send_booking_cancellation_email(booking):
     The Autohire Team
     """
     
-    try:
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[booking.user.email],
-            fail_silently=True,
-        )
-        return True
-    except Exception as e:
-        print(f"Error sending email: {e}")
-        return False
+    return queue_email(booking.user.email, subject, message)
 
 
 def send_welcome_email(user):
-    """Send welcome email to newly registered user"""
+    """Queue welcome email to newly registered user"""
     subject = 'Welcome to Autohire!'
     
     message = f"""
@@ -102,15 +89,4 @@ def send_welcome_email(user):
     The Autohire Team
     """
     
-    try:
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            fail_silently=True,
-        )
-        return True
-    except Exception as e:
-        print(f"Error sending email: {e}")
-        return False
\ No newline at end of file
+    return queue_email(user.email, subject, message)
\ No newline at end of file
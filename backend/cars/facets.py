@@ -0,0 +1,79 @@
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from .filters import filter_cars, filter_signature
+from .models import Car, Feature, CarType, FuelType, Transmission
+
+# (min, max) price per day; max is exclusive, None means open-ended
+PRICE_BUCKETS = [(0, 50), (50, 100), (100, 200), (200, 500), (500, None)]
+
+CHOICES = {
+    'car_type': CarType,
+    'fuel_type': FuelType,
+    'transmission': Transmission,
+}
+
+
+def _price_q(low, high):
+    q = Q(price_per_day__gte=low)
+    if high is not None:
+        q &= Q(price_per_day__lt=high)
+    return q
+
+
+def compute_facets(cars):
+    """Facet counts for a filtered car queryset in three queries.
+
+    The choice fields and price buckets have a fixed set of values, so
+    they are counted together in one conditional aggregate. Brands and
+    features are open-ended and each take one GROUP BY.
+    """
+    cars = cars.order_by()
+
+    aggregates = {'total': Count('id')}
+    for field, choices in CHOICES.items():
+        for value, _ in choices:
+            aggregates[f'{field}:{value}'] = Count('id', filter=Q(**{field: value}))
+    for index, (low, high) in enumerate(PRICE_BUCKETS):
+        aggregates[f'price:{index}'] = Count('id', filter=_price_q(low, high))
+    counts = cars.aggregate(**aggregates)
+
+    brands = cars.filter(brand__isnull=False).values('brand_id', 'brand__name').annotate(count=Count('id'))
+    features = Feature.objects.filter(cars__in=cars).values('id', 'name').annotate(count=Count('cars'))
+
+    facets = {'total': counts['total']}
+    for field, choices in CHOICES.items():
+        facets[field] = [
+            {'value': value, 'count': counts[f'{field}:{value}']}
+            for value, _ in choices
+        ]
+    facets['brand'] = sorted(
+        ({'id': row['brand_id'], 'name': row['brand__name'], 'count': row['count']} for row in brands),
+        key=lambda row: row['name'],
+    )
+    facets['features'] = sorted(
+        ({'id': row['id'], 'name': row['name'], 'count': row['count']} for row in features),
+        key=lambda row: row['name'],
+    )
+    facets['price'] = [
+        {'min': low, 'max': high, 'count': counts[f'price:{index}']}
+        for index, (low, high) in enumerate(PRICE_BUCKETS)
+    ]
+    return facets
+
+
+def get_facets(params, catalog_version):
+    """Facet counts for the filters in params, cached per filter signature.
+
+    The catalog version is part of the key, so any catalog write makes
+    older entries unreachable.
+    """
+    signature = filter_signature(params)
+    key = f'cars:facets:{catalog_version}:' + hashlib.md5(signature.encode()).hexdigest()
+
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(filter_cars(Car.objects.all(), params))
+        cache.set(key, facets, settings.CATALOG_CACHE_TIMEOUT)
+    return facets
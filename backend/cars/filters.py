@@ -0,0 +1,104 @@
+from decimal import Decimal, InvalidOperation
+from rest_framework.exceptions import ValidationError
+from .models import CarType, FuelType, Transmission
+
+# Query parameter -> allowed values for exact-match filters
+CHOICE_FILTERS = {
+    'car_type': {value for value, _ in CarType},
+    'fuel_type': {value for value, _ in FuelType},
+    'transmission': {value for value, _ in Transmission},
+}
+
+# Query parameter -> (model field, lookup, parser) for range filters
+RANGE_FILTERS = {
+    'min_price': ('price_per_day', 'gte', Decimal),
+    'max_price': ('price_per_day', 'lte', Decimal),
+    'min_year': ('year', 'gte', int),
+    'max_year': ('year', 'lte', int),
+}
+
+BOOLEAN_FILTERS = ('is_available', 'featured')
+
+ORDERING_FIELDS = ('price_per_day', 'year', 'name', 'average_rating', 'horsepower')
+
+# Non-nullable ordering fields, usable as a pagination keyset
+KEYSET_ORDERING_FIELDS = ('price_per_day', 'year', 'name', 'average_rating')
+
+# Every parameter that narrows the set of cars
+FILTER_PARAMS = tuple(CHOICE_FILTERS) + ('brand',) + tuple(RANGE_FILTERS) + BOOLEAN_FILTERS
+
+
+def _split(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def _parse_bool(name, value):
+    lowered = value.lower()
+    if lowered in ('true', '1', 'yes'):
+        return True
+    if lowered in ('false', '0', 'no'):
+        return False
+    raise ValidationError({name: 'Expected true or false'})
+
+
+def filter_signature(params):
+    """Canonical string for the filters in params, ignoring order and unknown keys.
+
+    ?brand=3,1&car_type=SUV and ?car_type=SUV&brand=1,3 give the same signature.
+    """
+    parts = []
+    for name in sorted(FILTER_PARAMS):
+        if params.get(name):
+            values = sorted(_split(params[name])) if name in CHOICE_FILTERS or name == 'brand' else [params[name].strip().lower()]
+            parts.append(f'{name}={",".join(values)}')
+    return '&'.join(parts)
+
+
+def filter_cars(queryset, params):
+    """Apply catalog filters from query parameters.
+
+    Comma-separated values are accepted for the choice filters and brand,
+    e.g. ?car_type=SUV,Sedan&brand=1,3. Invalid values raise a 400.
+    """
+    for name, allowed in CHOICE_FILTERS.items():
+        if params.get(name):
+            values = _split(params[name])
+            invalid = [value for value in values if value not in allowed]
+            if invalid:
+                raise ValidationError({name: f'Invalid choice: {", ".join(invalid)}'})
+            queryset = queryset.filter(**{f'{name}__in': values})
+
+    if params.get('brand'):
+        try:
+            brand_ids = [int(value) for value in _split(params['brand'])]
+        except ValueError:
+            raise ValidationError({'brand': 'Expected brand ids'})
+        queryset = queryset.filter(brand_id__in=brand_ids)
+
+    for name, (field, lookup, parse) in RANGE_FILTERS.items():
+        if params.get(name):
+            try:
+                value = parse(params[name])
+            except (ValueError, InvalidOperation):
+                raise ValidationError({name: 'Expected a number'})
+            queryset = queryset.filter(**{f'{field}__{lookup}': value})
+
+    for name in BOOLEAN_FILTERS:
+        if params.get(name):
+            queryset = queryset.filter(**{name: _parse_bool(name, params[name])})
+
+    return queryset
+
+
+def order_cars(queryset, params):
+    """Apply ?ordering= from the whitelist, with id as a stable tiebreaker"""
+    ordering = params.get('ordering')
+    if not ordering:
+        return queryset
+
+    field = ordering.removeprefix('-')
+    if field not in ORDERING_FIELDS:
+        raise ValidationError({'ordering': f'Choose one of: {", ".join(ORDERING_FIELDS)}'})
+
+    descending = ordering.startswith('-')
+    return queryset.order_by(ordering, '-id' if descending else 'id')
@@ -0,0 +1,103 @@
+"""Cars x days occupancy matrix for the admin fleet calendar.
+
+Each cell holds one status code (see STATUSES). The grid comes from two
+queries, one for the cars and one for the active bookings in the window,
+and is filled with NumPy difference arrays, so the Python work doesn't
+grow with the number of cells.
+
+Rows are returned in one of two compact encodings:
+
+- rle: per car, a flat [status, days, status, days, ...] list
+- packed: the whole grid at 2 bits per cell, most significant bits
+  first, row-major, as one base64 string of row_bytes bytes per car
+
+There is no maintenance schedule yet, so a car taken out of service
+(is_available=False) shows as maintenance for the whole window.
+"""
+import base64
+import numpy as np
+from .models import Booking, Car
+
+STATUSES = ('free', 'pending', 'booked', 'maintenance')
+FREE, PENDING, BOOKED, MAINTENANCE = range(len(STATUSES))
+ENCODINGS = ('rle', 'packed')
+
+
+def occupancy_grid(start, days):
+    """(cars, grid): car rows ordered by id and a uint8 cars x days grid of status codes"""
+    end = start + np.timedelta64(days, 'D')
+    cars = list(Car.objects.order_by('id').values_list('id', 'name', 'is_available'))
+    grid = np.zeros((len(cars), days), dtype=np.uint8)
+    if not cars:
+        return cars, grid
+
+    bookings = list(Booking.objects.filter(
+        status__in=Booking.ACTIVE_STATUSES,
+        pickup_date__lt=end.item(),
+        return_date__gt=start.item(),
+    ).values_list('car_id', 'pickup_date', 'return_date', 'status'))
+
+    if bookings:
+        car_ids = np.array([car[0] for car in cars])
+        booking_cars, pickups, returns, statuses = zip(*bookings)
+        rows = np.searchsorted(car_ids, booking_cars)
+        first_days = np.clip((np.array(pickups, dtype='datetime64[D]') - start).astype(int), 0, days)
+        last_days = np.clip((np.array(returns, dtype='datetime64[D]') - start).astype(int), 0, days)
+        confirmed = np.array(statuses) == 'confirmed'
+
+        # Pending first so confirmed bookings win any overlap
+        for code, selected in ((PENDING, ~confirmed), (BOOKED, confirmed)):
+            diff = np.zeros((len(cars), days + 1), dtype=np.int32)
+            np.add.at(diff, (rows[selected], first_days[selected]), 1)
+            np.add.at(diff, (rows[selected], last_days[selected]), -1)
+            grid[np.cumsum(diff[:, :days], axis=1) > 0] = code
+
+    grid[~np.array([car[2] for car in cars])] = MAINTENANCE
+    return cars, grid
+
+
+def run_length_rows(grid):
+    """Per row, a flat [status, length, ...] list of its runs"""
+    cars, days = grid.shape
+    if not cars or not days:
+        return [[] for _ in range(cars)]
+
+    starts = np.ones(grid.shape, dtype=bool)
+    starts[:, 1:] = grid[:, 1:] != grid[:, :-1]
+    rows, columns = np.nonzero(starts)
+
+    # A run ends where the next one in its row starts, or at the row's end
+    ends = np.empty_like(columns)
+    ends[:-1] = columns[1:]
+    row_ends = np.ones(len(rows), dtype=bool)
+    row_ends[:-1] = rows[1:] != rows[:-1]
+    ends[row_ends] = days
+
+    pairs = np.column_stack([grid[rows, columns], ends - columns]).ravel()
+    splits = np.cumsum(np.bincount(rows, minlength=cars) * 2)[:-1]
+    return [row.tolist() for row in np.split(pairs, splits)]
+
+
+def packed_rows(grid):
+    """(row_bytes, base64 of the grid at 2 bits per cell)"""
+    cars, days = grid.shape
+    bits = (grid[:, :, None] >> np.array([1, 0], dtype=np.uint8)) & 1
+    packed = np.packbits(bits.reshape(cars, days * 2), axis=1)
+    return packed.shape[1], base64.b64encode(packed.tobytes()).decode()
+
+
+def fleet_calendar(start, days, encoding='rle'):
+    cars, grid = occupancy_grid(np.datetime64(start, 'D'), days)
+    data = {
+        'start': start,
+        'days': days,
+        'statuses': STATUSES,
+        'car_ids': [car[0] for car in cars],
+        'car_names': [car[1] for car in cars],
+        'encoding': encoding,
+    }
+    if encoding == 'packed':
+        data['row_bytes'], data['rows'] = packed_rows(grid)
+    else:
+        data['rows'] = run_length_rows(grid)
+    return data
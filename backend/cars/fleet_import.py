@@ -0,0 +1,133 @@
+"""Bulk fleet import from CSV or JSON.
+
+Each record is one car, validated with CarImportSerializer. The brand is
+given by name and must already exist. Features are also given by name;
+any that don't exist yet are created. The car image and the gallery
+images are Cloudinary public ids. In CSV, features and images are
+separated by semicolons.
+
+import_fleet() validates every record before writing anything, and
+reports all failing rows at once. It then resolves brands and features
+with one query each and writes everything in one transaction: cars with
+bulk_create, then the Car.features through rows and the CarImage rows in
+bulk. Image URLs are built before the insert. A dry run does the same
+writes and rolls them back.
+
+bulk_create sends no signals, so the search index, catalog version and
+response cache are brought up to date here.
+"""
+import csv
+import io
+import json
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+from .models import Brand, Car, CarImage, Feature
+from .serializers import CarImportSerializer
+from .images import build_image_urls
+from .catalog import bump_catalog_version
+from .response_cache import invalidate
+from .search import update_search_index
+
+FILE_FORMATS = ('csv', 'json')
+LIST_COLUMNS = ('features', 'images')
+BATCH_SIZE = 500
+
+
+def parse_fleet_file(text, file_format):
+    """Records (dicts) from the text of a CSV or JSON fleet file"""
+    if file_format == 'json':
+        try:
+            records = json.loads(text)
+        except ValueError as error:
+            raise ValidationError({'file': f'Invalid JSON: {error}'})
+        if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+            raise ValidationError({'file': 'Expected a JSON array of objects'})
+        return records
+
+    records = []
+    for row in csv.DictReader(io.StringIO(text)):
+        # Blank cells mean "use the default", not an empty value
+        record = {column: value.strip() for column, value in row.items() if column and value and value.strip()}
+        for column in LIST_COLUMNS:
+            if column in record:
+                record[column] = [item.strip() for item in record[column].split(';') if item.strip()]
+        records.append(record)
+    return records
+
+
+def validate_records(records):
+    """([(row number, validated data)], errors), where errors are {'row': n, 'errors': {...}}; rows count from 1"""
+    rows, errors = [], []
+    for number, record in enumerate(records, start=1):
+        serializer = CarImportSerializer(data=record)
+        if serializer.is_valid():
+            rows.append((number, serializer.validated_data))
+        else:
+            errors.append({'row': number, 'errors': serializer.errors})
+    return rows, errors
+
+
+def import_fleet(records, dry_run=False):
+    """Create a car per record; returns {'cars', 'features', 'images', 'new_features'} counts.
+
+    Raises ValidationError listing every invalid row, before any write.
+    """
+    if not records:
+        raise ValidationError({'file': 'No cars to import'})
+    rows, errors = validate_records(records)
+    brand_names = {row['brand'] for _, row in rows if row.get('brand')}
+    brands = dict(Brand.objects.filter(name__in=brand_names).values_list('name', 'id'))
+    errors += [
+        {'row': number, 'errors': {'brand': [f'Unknown brand "{row["brand"]}"']}}
+        for number, row in rows
+        if row.get('brand') and row['brand'] not in brands
+    ]
+    if errors:
+        raise ValidationError({'rows': sorted(errors, key=lambda error: error['row'])})
+    rows = [row for _, row in rows]
+
+    feature_names = {name for row in rows for name in row.get('features', [])}
+    with transaction.atomic():
+        features = dict(Feature.objects.filter(name__in=feature_names).values_list('name', 'id'))
+        new_features = Feature.objects.bulk_create(
+            [Feature(name=name) for name in sorted(feature_names - features.keys())], batch_size=BATCH_SIZE,
+        )
+        features.update((feature.name, feature.id) for feature in new_features)
+
+        cars = []
+        for row in rows:
+            fields = {name: value for name, value in row.items() if name not in ('brand', 'image', 'features', 'images')}
+            car = Car(**fields, brand_id=brands.get(row.get('brand')), image=row.get('image') or None)
+            car.image_urls = build_image_urls(car)
+            cars.append(car)
+        Car.objects.bulk_create(cars, batch_size=BATCH_SIZE)
+
+        Through = Car.features.through
+        through_rows = [
+            Through(car_id=car.pk, feature_id=feature_id)
+            for car, row in zip(cars, rows)
+            for feature_id in {features[name] for name in row.get('features', [])}
+        ]
+        Through.objects.bulk_create(through_rows, batch_size=BATCH_SIZE)
+
+        images = []
+        for car, row in zip(cars, rows):
+            for public_id in row.get('images', []):
+                image = CarImage(car_id=car.pk, image=public_id)
+                image.image_urls = build_image_urls(image)
+                images.append(image)
+        CarImage.objects.bulk_create(images, batch_size=BATCH_SIZE)
+
+        update_search_index(car.pk for car in cars)
+        if dry_run:
+            transaction.set_rollback(True)
+        else:
+            bump_catalog_version()
+            invalidate('cars', 'car-detail', 'brands', 'features', 'admin-stats')
+
+    return {
+        'cars': len(cars),
+        'features': len(through_rows),
+        'images': len(images),
+        'new_features': len(new_features),
+    }
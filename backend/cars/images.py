@@ -0,0 +1,76 @@
+"""Precomputed Cloudinary delivery URLs.
+
+Building a Cloudinary URL means formatting the transformation and
+assembling the delivery string. Doing that once per image at save time
+(see the post_save handler in cars.signals), instead of once per object
+on every request, leaves serializers a dict lookup.
+
+Each image_urls dict holds the original URL plus one URL per variant
+below. After changing the variants, run `manage.py refresh_image_urls`.
+"""
+from django.db.models import Q
+from .models import Brand, Car, CarImage
+from .catalog import bump_catalog_version
+from .response_cache import invalidate
+
+# name -> (rendered width, Cloudinary transformation)
+IMAGE_VARIANTS = {
+    'thumbnail': (160, {'width': 160, 'height': 120, 'crop': 'fill'}),
+    'card': (480, {'width': 480, 'height': 320, 'crop': 'fill'}),
+    'hero': (1600, {'width': 1600, 'crop': 'limit'}),
+}
+
+# Let Cloudinary pick the format (WebP/AVIF) and compression per browser
+DELIVERY_OPTIONS = {'quality': 'auto', 'fetch_format': 'auto'}
+
+IMAGE_MODELS = (Car, Brand, CarImage)
+
+
+def build_image_urls(instance):
+    # Freshly assigned public ids are still plain strings
+    image = instance._meta.get_field('image').to_python(instance.image)
+    if not image:
+        return {}
+    urls = {'original': image.url}
+    for name, (_, transformation) in IMAGE_VARIANTS.items():
+        urls[name] = image.build_url(**transformation, **DELIVERY_OPTIONS)
+    return urls
+
+
+def store_image_urls(instance):
+    """Write instance.image_urls without re-saving (and re-signalling) the row"""
+    urls = build_image_urls(instance)
+    if urls != instance.image_urls:
+        instance.image_urls = urls
+        type(instance).objects.filter(pk=instance.pk).update(image_urls=urls)
+
+
+def refresh_image_urls(missing_only=False):
+    refreshed = 0
+    for model in IMAGE_MODELS:
+        objects = model.objects.all()
+        if missing_only:
+            objects = objects.filter(Q(image_urls={}) & ~Q(image=None) & ~Q(image=''))
+        updated = []
+        for instance in objects.only('pk', 'image', 'image_urls').iterator(chunk_size=500):
+            urls = build_image_urls(instance)
+            if urls != instance.image_urls:
+                instance.image_urls = urls
+                updated.append(instance)
+        model.objects.bulk_update(updated, ['image_urls'], batch_size=500)
+        refreshed += len(updated)
+
+    if refreshed:
+        # bulk_update sends no signals
+        bump_catalog_version()
+        invalidate('cars', 'car-detail', 'brands')
+    return refreshed
+
+
+def srcset(image_urls):
+    """Variant URLs keyed by width descriptor, e.g. {'480w': url}"""
+    return {
+        f'{width}w': image_urls[name]
+        for name, (width, _) in IMAGE_VARIANTS.items()
+        if name in image_urls
+    }
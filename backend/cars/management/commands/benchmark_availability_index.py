@@ -0,0 +1,75 @@
+import pickle
+import random
+import sys
+import time
+from datetime import date, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from cars.availability_index import day_mask
+
+BENCHMARK_KEY = 'cars:availability-benchmark:{}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures the memory and lookup cost of the availability index for a synthetic fleet '
+        'with random bookings, through the configured cache backend'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cars', type=int, default=1000)
+        parser.add_argument('--bookings', type=int, default=40, help='Bookings per car per year')
+        parser.add_argument('--searches', type=int, default=200)
+        parser.add_argument('--year', type=int, default=date.today().year)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        year, first = options['year'], date(options['year'], 1, 1)
+
+        def random_range(max_days):
+            start = first + timedelta(days=rng.randrange(365))
+            return start, start + timedelta(days=rng.randint(1, max_days))
+
+        bitsets = {}
+        for car_id in range(options['cars']):
+            bits = 0
+            for _ in range(options['bookings']):
+                bits |= day_mask(year, *random_range(5))
+            bitsets[car_id] = bits
+
+        payload = sum((bits.bit_length() + 7) // 8 for bits in bitsets.values())
+        in_memory = sum(sys.getsizeof(bits) for bits in bitsets.values())
+        pickled = sum(len(pickle.dumps(bits, pickle.HIGHEST_PROTOCOL)) for bits in bitsets.values())
+        per_thousand = 1000 / options['cars']
+        self.stdout.write(
+            f'{options["cars"]} cars, {options["bookings"]} bookings each: '
+            f'{payload * per_thousand / 1024:.1f} KB payload, {in_memory * per_thousand / 1024:.1f} KB as ints, '
+            f'{pickled * per_thousand / 1024:.1f} KB pickled per 1,000 cars per year'
+        )
+
+        searches = [random_range(7) for _ in range(options['searches'])]
+        began = time.perf_counter()
+        for start, end in searches:
+            mask = day_mask(year, start, end)
+            [car_id for car_id, bits in bitsets.items() if not bits & mask]
+        bitwise = (time.perf_counter() - began) / len(searches)
+
+        keys = {car_id: BENCHMARK_KEY.format(car_id) for car_id in bitsets}
+        cache.set_many({keys[car_id]: bits for car_id, bits in bitsets.items()}, 600)
+        try:
+            began = time.perf_counter()
+            for start, end in searches:
+                mask = day_mask(year, start, end)
+                found = cache.get_many(keys.values())
+                [key for key, bits in found.items() if not bits & mask]
+            cached = (time.perf_counter() - began) / len(searches)
+        finally:
+            cache.delete_many(keys.values())
+
+        backend = settings.CACHES['default']['BACKEND'].rsplit('.', 1)[-1]
+        self.stdout.write(
+            f'Fleet search: {bitwise * 1000:.2f} ms bitwise in process, '
+            f'{cached * 1000:.2f} ms including the cache read ({backend})'
+        )
@@ -0,0 +1,110 @@
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+from cars.bookings import BookingConflict, reserve_dates, save_or_conflict
+from cars.models import Booking, Car
+
+BENCHMARK_USER = 'booking-benchmark'
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures booking throughput with parallel reservation attempts on the same car '
+        'and on different cars, then checks that no car ended up double-booked. '
+        'Creates its own cars and bookings in the configured database and deletes them afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--attempts', type=int, default=50, help='Attempts per worker')
+        parser.add_argument('--window', type=int, default=90, help='Days the random bookings fall in')
+        parser.add_argument('--scenario', choices=['same', 'different', 'both'], default='both')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        scenarios = ['same', 'different'] if options['scenario'] == 'both' else [options['scenario']]
+        self.stdout.write(f'{connection.vendor}, {options["workers"]} workers x {options["attempts"]} attempts')
+
+        user, _ = User.objects.get_or_create(username=BENCHMARK_USER)
+        try:
+            for scenario in scenarios:
+                cars = [
+                    Car.objects.create(
+                        name=f'Benchmark car {i}', year=2024, price_per_day=100, car_type='Sedan',
+                        description='Booking benchmark', transmission='Automatic', fuel_type='Petrol',
+                    )
+                    for i in range(1 if scenario == 'same' else options['workers'])
+                ]
+                self.run_scenario(scenario, user, cars, options)
+                Car.objects.filter(pk__in=[car.pk for car in cars]).delete()
+        finally:
+            user.delete()
+
+    def run_scenario(self, scenario, user, cars, options):
+        start_date = timezone.localdate() + timedelta(days=365)
+
+        def worker(index):
+            rng = random.Random(options['seed'] * 1000 + index)
+            car = cars[index % len(cars)]
+            results = {'reserved': 0, 'conflicts': 0, 'errors': 0, 'latencies': []}
+            try:
+                for _ in range(options['attempts']):
+                    pickup = start_date + timedelta(days=rng.randrange(options['window']))
+                    return_date = pickup + timedelta(days=rng.randint(1, 5))
+                    began = time.perf_counter()
+                    try:
+                        with transaction.atomic():
+                            reserve_dates(car.pk, pickup, return_date)
+                            save_or_conflict(
+                                Booking.objects.create, user=user, car=car,
+                                pickup_date=pickup, return_date=return_date,
+                                total_days=(return_date - pickup).days, total_cost=100,
+                            )
+                        results['reserved'] += 1
+                    except BookingConflict:
+                        results['conflicts'] += 1
+                    except DatabaseError:
+                        # e.g. SQLite "database is locked" past the busy timeout
+                        results['errors'] += 1
+                    results['latencies'].append(time.perf_counter() - began)
+            finally:
+                connection.close()
+            return results
+
+        began = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            results = list(pool.map(worker, range(options['workers'])))
+        elapsed = time.perf_counter() - began
+
+        latencies = sorted(latency for result in results for latency in result['latencies'])
+        totals = {key: sum(result[key] for result in results) for key in ('reserved', 'conflicts', 'errors')}
+        self.stdout.write(
+            f'{scenario} car(s): {len(latencies) / elapsed:.0f} attempts/s, '
+            f'{totals["reserved"]} reserved, {totals["conflicts"]} conflicts, {totals["errors"]} errors, '
+            f'p50 {statistics.median(latencies) * 1000:.1f} ms, '
+            f'p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms'
+        )
+
+        double_booked = self.double_booked(cars)
+        if double_booked:
+            self.stdout.write(self.style.ERROR(f'Double-booked cars: {double_booked}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('No overlapping bookings'))
+
+    def double_booked(self, cars):
+        double_booked = []
+        for car in cars:
+            booked = list(
+                car.bookings.filter(status__in=Booking.ACTIVE_STATUSES)
+                .order_by('pickup_date').values_list('pickup_date', 'return_date')
+            )
+            # Bookings may touch but not overlap
+            if any(previous[1] > current[0] for previous, current in zip(booked, booked[1:])):
+                double_booked.append(car.pk)
+        return double_booked
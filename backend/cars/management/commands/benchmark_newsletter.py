@@ -0,0 +1,44 @@
+import time
+import tracemalloc
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from cars.models import Newsletter, NewsletterCampaign
+from cars.newsletter import send_campaign
+
+BENCHMARK_DOMAIN = 'newsletter-benchmark.invalid'
+
+
+class Command(BaseCommand):
+    help = (
+        'Sends a campaign to a synthetic subscriber list through the dummy email backend and '
+        'reports throughput and peak Python memory. Creates its subscribers and campaign in the '
+        'configured database and deletes them afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, default=100_000)
+        parser.add_argument('--connections', type=int, default=4)
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        Newsletter.objects.bulk_create(
+            (Newsletter(email=f'subscriber-{i}@{BENCHMARK_DOMAIN}') for i in range(options['recipients'])),
+            batch_size=1000,
+        )
+        campaign = NewsletterCampaign.objects.create(subject='Benchmark', body='Benchmark newsletter')
+        try:
+            tracemalloc.start()
+            began = time.perf_counter()
+            with override_settings(EMAIL_BACKEND='django.core.mail.backends.dummy.EmailBackend'):
+                campaign = send_campaign(campaign, options['connections'], options['chunk_size'])
+            elapsed = time.perf_counter() - began
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            self.stdout.write(
+                f'{campaign.sent_count} sent in {elapsed:.1f} s ({campaign.sent_count / elapsed:.0f}/s), '
+                f'peak {peak / 1024 / 1024:.1f} MB traced'
+            )
+        finally:
+            campaign.delete()
+            Newsletter.objects.filter(email__endswith=f'@{BENCHMARK_DOMAIN}').delete()
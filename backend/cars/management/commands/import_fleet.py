@@ -0,0 +1,33 @@
+import json
+import os
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+from cars.fleet_import import FILE_FORMATS, import_fleet, parse_fleet_file
+
+
+class Command(BaseCommand):
+    help = 'Imports cars, with their features and gallery images, from a CSV or JSON file in one transaction'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSON file, one car per row or object')
+        parser.add_argument('--format', choices=FILE_FORMATS, help='File format; defaults to the file extension')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and insert, then roll back')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if file_format not in FILE_FORMATS:
+            raise CommandError(f'Unknown file format; pass --format {" or ".join(FILE_FORMATS)}')
+
+        with open(path, encoding='utf-8-sig') as file:
+            text = file.read()
+        try:
+            summary = import_fleet(parse_fleet_file(text, file_format), options['dry_run'])
+        except ValidationError as error:
+            raise CommandError(json.dumps(error.detail, indent=2))
+
+        prefix = 'Would import' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix} {summary["cars"]} car(s) with {summary["features"]} feature link(s) and '
+            f'{summary["images"]} image(s); {summary["new_features"]} new feature(s)'
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from cars.availability_index import rebuild_availability_index
+from cars.models import Car
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the per-car day-bitmap availability index (this year and next by default)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, action='append', dest='years', help='Year to rebuild; repeatable')
+
+    def handle(self, *args, **options):
+        this_year = timezone.localdate().year
+        years = options['years'] or [this_year, this_year + 1]
+        written = rebuild_availability_index(list(Car.objects.values_list('id', flat=True)), years)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} bitset(s) for {", ".join(map(str, years))}'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from cars.ratings import rebuild_rating_aggregates
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the stored rating sum, count and average on every car from its reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('car_ids', nargs='*', type=int, help='Only rebuild these cars')
+
+    def handle(self, *args, **options):
+        car_ids = options['car_ids'] or None
+        updated = rebuild_rating_aggregates(car_ids)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating aggregates for {updated} car(s)'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from cars.models import RevenueRollup
+from cars.revenue import rebuild_revenue_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the day and month revenue rollups from paid bookings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--missing', action='store_true', help='Only rebuild if there are no rollups yet')
+
+    def handle(self, *args, **options):
+        if options['missing'] and RevenueRollup.objects.exists():
+            self.stdout.write('Revenue rollups already present, skipping')
+            return
+        written = rebuild_revenue_rollups()
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} revenue rollup(s)'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from cars.reconciliation import reconcile_payments
+
+
+class Command(BaseCommand):
+    help = 'Settles bookings stuck in pending or processing payment status from Stripe checkout sessions, in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since-days', type=int, default=7, help='Only bookings created in the last N days')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would change without saving')
+
+    def handle(self, *args, **options):
+        summary = reconcile_payments(options['since_days'], options['dry_run'])
+        prefix = 'Would settle' if options['dry_run'] else 'Settled'
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix} {summary["paid"]} paid and {summary["expired"]} expired of {summary["checked"]} '
+            f'unsettled booking(s), from {summary["sessions"]} Stripe session(s)'
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from cars.images import refresh_image_urls
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the stored Cloudinary image URLs and variants for cars, brands and car images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--missing', action='store_true', help='Only fill in images without stored URLs')
+
+    def handle(self, *args, **options):
+        refreshed = refresh_image_urls(missing_only=options['missing'])
+        self.stdout.write(self.style.SUCCESS(f'Refreshed image URLs for {refreshed} object(s)'))
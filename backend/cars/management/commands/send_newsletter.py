@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from cars.models import NewsletterCampaign
+from cars.newsletter import CampaignInProgress, send_campaign
+
+
+class Command(BaseCommand):
+    help = 'Sends a newsletter campaign to every active subscriber, resuming an interrupted send where it stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('campaign_id', type=int)
+        parser.add_argument('--connections', type=int, default=4, help='Concurrent SMTP connections')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Subscribers per checkpoint')
+
+    def handle(self, *args, **options):
+        try:
+            campaign = NewsletterCampaign.objects.get(pk=options['campaign_id'])
+        except NewsletterCampaign.DoesNotExist:
+            raise CommandError(f'Campaign {options["campaign_id"]} not found')
+        if campaign.status == 'sent':
+            raise CommandError(f'Campaign {campaign.pk} was already sent')
+        if campaign.status == 'sending':
+            self.stdout.write(f'Resuming after subscriber {campaign.last_subscriber_id}')
+
+        def progress(last_id, sent, failed):
+            self.stdout.write(f'Up to subscriber {last_id}: {sent} sent, {failed} failed')
+
+        try:
+            campaign = send_campaign(campaign, options['connections'], options['chunk_size'], progress)
+        except CampaignInProgress as error:
+            raise CommandError(str(error))
+        self.stdout.write(self.style.SUCCESS(
+            f'Campaign {campaign.pk} sent to {campaign.sent_count} subscriber(s), {campaign.failed_count} failed'
+        ))
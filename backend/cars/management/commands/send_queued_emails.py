@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand
+from cars.outbox import deliver_outbox
+
+
+class Command(BaseCommand):
+    help = 'Delivers queued transactional email from the outbox, in batches over one SMTP connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting once the outbox is drained')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to sleep when the outbox is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            counts = deliver_outbox(options['batch_size'])
+            if any(counts.values()):
+                self.stdout.write(
+                    f'Sent {counts["sent"]}, retrying {counts["retrying"]}, failed {counts["failed"]}'
+                )
+            elif options['loop']:
+                time.sleep(options['interval'])
+            else:
+                break
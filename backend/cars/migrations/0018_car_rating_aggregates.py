@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:17
+
+from django.db import migrations, models
+from django.db.models import Case, Count, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Round
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Car = apps.get_model('cars', 'Car')
+    Review = apps.get_model('cars', 'Review')
+
+    reviews = Review.objects.filter(car=OuterRef('pk')).order_by().values('car')
+    Car.objects.update(
+        rating_sum=Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total'), output_field=IntegerField()), 0),
+        review_count=Coalesce(Subquery(reviews.annotate(count=Count('id')).values('count'), output_field=IntegerField()), 0),
+    )
+    Car.objects.update(average_rating=Case(
+        When(review_count=0, then=Value(0.0)),
+        default=Round(Cast(F('rating_sum'), FloatField()) / F('review_count'), 1),
+        output_field=FloatField(),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0017_contactmessage_newsletter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='average_rating',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
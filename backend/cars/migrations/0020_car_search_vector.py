@@ -0,0 +1,72 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:24
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Frozen copies of the cars.search layout as of this migration
+FTS_TABLE = 'cars_car_fts'
+
+FEATURE_NAMES = """
+    COALESCE((
+        SELECT {aggregate}
+        FROM cars_car_features car_feature
+        JOIN cars_feature feature ON feature.id = car_feature.feature_id
+        WHERE car_feature.car_id = car.id
+    ), '')
+"""
+
+SQLITE_BACKFILL = f"""
+    INSERT INTO {FTS_TABLE} (rowid, name, brand, features, color, description)
+    SELECT car.id, car.name, COALESCE(brand.name, ''), {FEATURE_NAMES.format(aggregate="group_concat(feature.name, ' ')")},
+           car.color, car.description
+    FROM cars_car car
+    LEFT JOIN cars_brand brand ON brand.id = car.brand_id
+"""
+
+POSTGRES_BACKFILL = f"""
+    UPDATE cars_car car SET search_vector =
+        setweight(to_tsvector('english', car.name), 'A')
+        || setweight(to_tsvector('english', COALESCE(brand.name, '')), 'A')
+        || setweight(to_tsvector('english', {FEATURE_NAMES.format(aggregate="string_agg(feature.name, ' ')")}), 'B')
+        || setweight(to_tsvector('english', car.color), 'C')
+        || setweight(to_tsvector('english', car.description), 'D')
+    FROM cars_car source
+    LEFT JOIN cars_brand brand ON brand.id = source.brand_id
+    WHERE source.id = car.id
+"""
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('CREATE INDEX cars_car_search_vector_gin ON cars_car USING gin (search_vector)')
+        schema_editor.execute(POSTGRES_BACKFILL)
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(name, brand, features, color, description, tokenize='porter unicode61')"
+        )
+        schema_editor.execute(SQLITE_BACKFILL)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS cars_car_search_vector_gin')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0019_car_catalog_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:23
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def create_stamp(apps, schema_editor):
+    CatalogStamp = apps.get_model('cars', 'CatalogStamp')
+    CatalogStamp.objects.get_or_create(pk=1, defaults={'version': 1, 'updated_at': timezone.now()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0021_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogStamp',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(create_stamp, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+from django.db import migrations
+
+# Mirrors Booking.ACTIVE_STATUSES and cars.bookings.EXCLUSION_CONSTRAINT
+ADD_CONSTRAINT = """
+ALTER TABLE cars_booking ADD CONSTRAINT booking_no_overlap EXCLUDE USING gist (
+    car_id WITH =,
+    daterange(pickup_date, return_date, '[)') WITH &&
+) WHERE (status IN ('pending', 'confirmed'))
+"""
+
+FIND_OVERLAPS = """
+SELECT a.id, b.id FROM cars_booking a
+JOIN cars_booking b ON a.car_id = b.car_id AND a.id < b.id
+WHERE a.status IN ('pending', 'confirmed') AND b.status IN ('pending', 'confirmed')
+  AND a.pickup_date < b.return_date AND a.return_date > b.pickup_date
+"""
+
+
+def add_exclusion_constraint(apps, schema_editor):
+    # Row locking in cars.bookings covers the other backends
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(FIND_OVERLAPS)
+        overlaps = cursor.fetchall()
+    if overlaps:
+        pairs = ', '.join(f'{a}/{b}' for a, b in overlaps[:20])
+        raise RuntimeError(
+            f'Cancel one booking of each overlapping pair before migrating: {pairs}'
+        )
+
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    schema_editor.execute(ADD_CONSTRAINT)
+
+
+def drop_exclusion_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('ALTER TABLE cars_booking DROP CONSTRAINT IF EXISTS booking_no_overlap')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0024_booking_active_range_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_exclusion_constraint, drop_exclusion_constraint),
+    ]
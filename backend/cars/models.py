@@ -1,7 +1,9 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from cloudinary.models import CloudinaryField
+from django.contrib.postgres.search import SearchVectorField
 
 
 # Create your models here.
@@ -34,6 +36,8 @@ class Feature(models.Model):
 class Brand(models.Model):
     name = models.CharField(max_length=255)
     image = CloudinaryField('image', folder='cars/related/')
+    # Delivery URLs built at save time (see cars.images)
+    image_urls = models.JSONField(default=dict, blank=True, editable=False)
     
     class Meta:
         ordering = ['name']
@@ -52,6 +56,7 @@ class Car(models.Model):
     transmission = models.CharField(max_length=255, choices=Transmission)
     fuel_type = models.CharField(max_length=255, choices=FuelType)
     image = CloudinaryField('image', folder='cars/', blank=True, null=True)
+    image_urls = models.JSONField(default=dict, blank=True, editable=False)
     color = models.CharField(max_length=255, blank=True)
     license_plate = models.CharField(max_length=255, blank=True)
     features = models.ManyToManyField(Feature, related_name='cars')
@@ -61,30 +66,51 @@ class Car(models.Model):
     is_available = models.BooleanField(default=True)
     featured = models.BooleanField(default=False)
     
+    # Review aggregates, kept in sync by cars.ratings
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    average_rating = models.FloatField(default=0, editable=False)
+    
+    # Full-text document on PostgreSQL; SQLite uses an FTS5 table (see cars.search)
+    search_vector = SearchVectorField(null=True, editable=False)
+    
     class Meta:
         ordering = ['-featured']
+        # Composite indexes backing the catalog filters in cars.filters:
+        # an equality column first, then the price range most queries add
+        indexes = [
+            models.Index(fields=['car_type', 'price_per_day'], name='car_type_price_idx'),
+            models.Index(fields=['fuel_type', 'price_per_day'], name='car_fuel_price_idx'),
+            models.Index(fields=['transmission', 'price_per_day'], name='car_transmission_price_idx'),
+            models.Index(fields=['brand', 'price_per_day'], name='car_brand_price_idx'),
+            models.Index(fields=['is_available', 'featured', 'price_per_day'], name='car_available_price_idx'),
+            models.Index(fields=['year', 'price_per_day'], name='car_year_price_idx'),
+            # Keyset pagination in default order
+            models.Index(fields=['-featured', '-id'], name='car_featured_id_idx'),
+        ]
     
 
     def __str__(self):
         return self.name
     
-    @property
-    def average_rating(self):
-        """Calculate average rating for this car"""
-        reviews = self.reviews.all()
-        if reviews.exists():
-            return round(sum(review.rating for review in reviews) / reviews.count(), 1)
-        return 0
-    
-    @property
-    def review_count(self):
-        """Get total number of reviews"""
-        return self.reviews.count()
+
+class CatalogStamp(models.Model):
+    """Single row whose version is bumped on every change to catalog data.
+
+    Catalog endpoints derive their ETag and Last-Modified from it (see
+    cars.catalog).
+    """
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Catalog v{self.version}"
     
 
 class CarImage(models.Model):
     car = models.ForeignKey(Car, on_delete=models.CASCADE, related_name='images')
     image = CloudinaryField('image', folder='cars/related/')
+    image_urls = models.JSONField(default=dict, blank=True, editable=False)
     caption = models.CharField(max_length=255, blank=True)
 
     def __str__(self):
@@ -106,6 +132,9 @@ class Booking(models.Model):
         ('failed', 'Failed'),
     ]
     
+    # Statuses that hold the car for their dates
+    ACTIVE_STATUSES = ('pending', 'confirmed')
+    
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bookings')
     car = models.ForeignKey(Car, on_delete=models.CASCADE, related_name='bookings')
     pickup_date = models.DateField()
@@ -117,13 +146,28 @@ class Booking(models.Model):
     # Payment fields 
     payment_status = models.CharField(max_length=20, choices=PAYMENT_STATUS_CHOICES, default='pending')
     payment_intent_id = models.CharField(max_length=255, blank=True, null=True)
-    stripe_session_id = models.CharField(max_length=255, blank=True, null=True)
+    stripe_session_id = models.CharField(max_length=255, blank=True, null=True, db_index=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of a user's bookings
+            models.Index(fields=['user', '-created_at', '-id'], name='booking_user_created_idx'),
+            # Admin listing, newest first, unfiltered or by status, car or pickup date
+            models.Index(fields=['-created_at', '-id'], name='booking_created_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='booking_status_created_idx'),
+            models.Index(fields=['car', '-created_at', '-id'], name='booking_car_created_idx'),
+            models.Index(fields=['pickup_date'], name='booking_pickup_idx'),
+            # Overlap checks only ever look at active bookings
+            models.Index(
+                fields=['car', 'pickup_date', 'return_date'],
+                name='booking_active_range_idx',
+                condition=models.Q(status__in=['pending', 'confirmed']),
+            ),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.car.name} ({self.pickup_date} to {self.return_date})"
@@ -142,6 +186,11 @@ class Review(models.Model):
         ordering = ['-created_at']
         # One review per user per car
         unique_together = ['user', 'car']
+        indexes = [
+            # Keyset pagination, overall and per car
+            models.Index(fields=['-created_at', '-id'], name='review_created_idx'),
+            models.Index(fields=['car', '-created_at', '-id'], name='review_car_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.car.name} ({self.rating}★)"
@@ -156,6 +205,9 @@ class Wishlist(models.Model):
     class Meta:
         unique_together = ['user', 'car']  # User can only wishlist a car once
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='wishlist_user_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.car.name}"
@@ -185,4 +237,106 @@ class Newsletter(models.Model):
         ordering = ['-subscribed_at']
     
     def __str__(self):
-        return self.email
\ No newline at end of file
+        return self.email
+
+
+class EmailOutbox(models.Model):
+    """Transactional email waiting for the send_queued_emails worker"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Earliest retry for pending rows, claim expiry for sending ones
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name_plural = 'Email outbox'
+        indexes = [
+            # The worker's claim query
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.recipient} - {self.subject} ({self.status})"
+
+
+class NewsletterCampaign(models.Model):
+    """One newsletter broadcast to every active subscriber (see cars.newsletter)"""
+    STATUS_CHOICES = [
+        ('draft', 'Draft'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+    ]
+    
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
+    # Highest Newsletter id already handled; a resumed send starts after it
+    last_subscriber_id = models.PositiveBigIntegerField(default=0)
+    # Lease held by the run that is sending; another run may only take over once it lapses
+    claimed_until = models.DateTimeField(null=True, blank=True, editable=False)
+    sent_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.subject} ({self.status})"
+
+
+class StripeEvent(models.Model):
+    """Stripe webhook events already handled, so redeliveries are no-ops"""
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    booking = models.ForeignKey(Booking, on_delete=models.SET_NULL, null=True, blank=True, related_name='stripe_events')
+    received_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-received_at']
+    
+    def __str__(self):
+        return f"{self.type} ({self.event_id})"
+
+
+class RevenueRollup(models.Model):
+    """Paid booking revenue per car per day or month (see cars.revenue).
+
+    Buckets follow the booking's creation date, like the revenue chart
+    always has. Brand breakdowns join through the car.
+    """
+    PERIOD_CHOICES = [
+        ('day', 'Day'),
+        ('month', 'Month'),
+    ]
+    
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    # The day, or the first of the month
+    bucket = models.DateField()
+    car = models.ForeignKey(Car, on_delete=models.CASCADE, related_name='revenue_rollups')
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    bookings = models.IntegerField(default=0)
+    
+    class Meta:
+        ordering = ['period', 'bucket']
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'bucket', 'car'], name='revenue_rollup_bucket_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.car} {self.period} {self.bucket}: {self.revenue}"
@@ -0,0 +1,146 @@
+"""Newsletter broadcasts.
+
+send_campaign() walks the active subscribers in id order, one keyset
+chunk at a time, so memory stays flat however large the list gets. Each
+chunk is split across a pool of SMTP connections, one per sender thread,
+opened once and reused for the whole campaign. The message is rendered
+once; only the recipient changes per send.
+
+After each chunk the campaign records the last subscriber id it handled.
+A crashed or interrupted send resumes from there, so at most the chunk in
+flight at the time is sent twice.
+
+Only one run sends a campaign at a time. A run claims it with a
+conditional update and holds a lease (claimed_until) that every
+checkpoint extends. Another run can only take over once the lease has
+lapsed, and a run that finds its lease taken over stops.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Newsletter, NewsletterCampaign
+
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+class CampaignInProgress(Exception):
+    """Another run holds the campaign's lease"""
+
+
+def claim_campaign(campaign):
+    """Take the campaign's lease, or raise CampaignInProgress; returns the lease expiry"""
+    now = timezone.now()
+    claimed_until = now + CLAIM_TIMEOUT
+    claimable = Q(status='draft') | Q(status='sending', claimed_until__isnull=True) | Q(status='sending', claimed_until__lt=now)
+    claimed = NewsletterCampaign.objects.filter(claimable, pk=campaign.pk).update(
+        status='sending', claimed_until=claimed_until,
+        started_at=Coalesce('started_at', Value(now)),
+    )
+    if not claimed:
+        raise CampaignInProgress(f'Campaign {campaign.pk} is being sent by another run')
+    return claimed_until
+
+
+def subscriber_chunks(after_id, chunk_size):
+    """Lists of (id, email) for active subscribers with ids above after_id"""
+    while True:
+        chunk = list(
+            Newsletter.objects.filter(is_active=True, id__gt=after_id)
+            .order_by('id').values_list('id', 'email')[:chunk_size]
+        )
+        if not chunk:
+            return
+        yield chunk
+        after_id = chunk[-1][0]
+
+
+def render_campaign(campaign):
+    """Build the campaign's message once; returns a per-recipient factory"""
+    subject, body = campaign.subject, campaign.body.strip() + '\n'
+    headers = {'Precedence': 'bulk'}
+
+    def message_to(email, connection):
+        return EmailMessage(
+            subject=subject, body=body, from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[email], headers=headers, connection=connection,
+        )
+    return message_to
+
+
+class ConnectionPool:
+    """One lazily opened SMTP connection per sender thread"""
+
+    def __init__(self):
+        self.local = threading.local()
+        self.connections = []
+        self.lock = threading.Lock()
+
+    def get(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = get_connection()
+            with self.lock:
+                self.connections.append(connection)
+        return connection
+
+    def close(self):
+        for connection in self.connections:
+            connection.close()
+
+
+def send_campaign(campaign, connections=4, chunk_size=500, progress=None):
+    """Send campaign to every subscriber it hasn't reached yet; returns the campaign.
+
+    Raises CampaignInProgress if another run is sending it.
+    """
+    if campaign.status == 'sent':
+        return campaign
+    claimed_until = claim_campaign(campaign)
+    campaign.refresh_from_db(fields=['last_subscriber_id'])
+
+    message_to = render_campaign(campaign)
+    pool = ConnectionPool()
+
+    def send_slice(emails):
+        connection, sent = pool.get(), 0
+        for email in emails:
+            try:
+                sent += connection.send_messages([message_to(email, connection)])
+            except Exception:
+                # Drop the broken session; the next send reconnects
+                connection.close()
+        return sent
+
+    try:
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            for chunk in subscriber_chunks(campaign.last_subscriber_id, chunk_size):
+                emails = [email for _, email in chunk]
+                slices = [emails[i::connections] for i in range(connections)]
+                sent = sum(executor.map(send_slice, slices))
+
+                # Checkpoint and extend the lease, unless another run took it over
+                lease = timezone.now() + CLAIM_TIMEOUT
+                checkpointed = NewsletterCampaign.objects.filter(pk=campaign.pk, claimed_until=claimed_until).update(
+                    last_subscriber_id=chunk[-1][0],
+                    sent_count=F('sent_count') + sent,
+                    failed_count=F('failed_count') + len(emails) - sent,
+                    claimed_until=lease,
+                )
+                if not checkpointed:
+                    raise CampaignInProgress(f'Campaign {campaign.pk} was taken over by another run')
+                claimed_until = lease
+                if progress:
+                    progress(chunk[-1][0], sent, len(emails) - sent)
+    finally:
+        pool.close()
+
+    NewsletterCampaign.objects.filter(pk=campaign.pk, claimed_until=claimed_until).update(
+        status='sent', finished_at=timezone.now(), claimed_until=None,
+    )
+    campaign.refresh_from_db()
+    return campaign
@@ -0,0 +1,87 @@
+"""Delivery side of the email outbox (see cars.emails.queue_email).
+
+deliver_outbox() claims a batch of due messages, sends them over one
+SMTP connection and records each message's outcome:
+
+- sent: delivered, with sent_at set
+- pending: failed, retried after an exponential backoff
+- failed: gave up after EMAIL_OUTBOX_MAX_ATTEMPTS tries
+
+Claimed rows are marked sending with a claim expiry in next_attempt_at,
+so several workers can drain the outbox side by side, and rows claimed
+by a worker that died are picked up again once the claim expires.
+"""
+import random
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import EmailOutbox
+
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter, capped at a day"""
+    delay = min(settings.EMAIL_OUTBOX_BACKOFF * 2 ** (attempts - 1), 24 * 60 * 60)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def claim_batch(batch_size):
+    """Mark up to batch_size due messages as sending and return them"""
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(Q(status='pending') | Q(status='sending'), next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        EmailOutbox.objects.filter(pk__in=[message.pk for message in batch]).update(
+            status='sending', next_attempt_at=now + CLAIM_TIMEOUT,
+        )
+    return batch
+
+
+def deliver_outbox(batch_size=50):
+    """Send one batch; returns {'sent': n, 'retrying': n, 'failed': n}"""
+    counts = {'sent': 0, 'retrying': 0, 'failed': 0}
+    batch = claim_batch(batch_size)
+    if not batch:
+        return counts
+
+    connection = get_connection()
+    try:
+        for message in batch:
+            try:
+                # Opens the connection on first use, and again after a drop
+                EmailMessage(
+                    subject=message.subject,
+                    body=message.body,
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    to=[message.recipient],
+                    connection=connection,
+                ).send()
+            except Exception as error:
+                connection.close()
+                record_failure(message, error)
+                counts['failed' if message.status == 'failed' else 'retrying'] += 1
+            else:
+                message.status, message.sent_at = 'sent', timezone.now()
+                message.save(update_fields=['status', 'sent_at'])
+                counts['sent'] += 1
+    finally:
+        connection.close()
+    return counts
+
+
+def record_failure(message, error):
+    message.attempts += 1
+    message.last_error = f'{type(error).__name__}: {error}'
+    if message.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        message.status = 'failed'
+    else:
+        message.status = 'pending'
+        message.next_attempt_at = timezone.now() + retry_delay(message.attempts)
+    message.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
@@ -0,0 +1,150 @@
+import base64
+import json
+import operator
+from datetime import date, datetime
+from decimal import Decimal
+from functools import reduce
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(PageNumberPagination):
+    """Page numbers by default, keyset (cursor) pagination on request.
+
+    Clients opt in per request with ?pagination=cursor, then follow the
+    `next` / `previous` links, which carry an opaque ?cursor=. Each page is
+    fetched with a WHERE on the ordering key instead of OFFSET and without
+    a COUNT(*), so page N costs the same as page 1.
+
+    The view provides the ordering through `keyset_ordering` or
+    `get_keyset_ordering()`. The last field must be unique (normally id)
+    and none of them may be nullable. If the view returns None, the
+    request falls back to page numbers.
+    """
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.ordering = None
+        if request.query_params.get(self.mode_query_param) == 'cursor' or self.cursor_query_param in request.query_params:
+            self.ordering = self.get_keyset_ordering(view)
+        if not self.ordering:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        values, reverse = self.decode_cursor(request, queryset.model)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = [self._flip(field) for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._after(ordering, values))
+
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, values is not None
+
+        self.first, self.last = (rows[0], rows[-1]) if rows else (None, None)
+        return rows
+
+    def get_paginated_response(self, data):
+        if not self.ordering:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.ordering:
+            return super().get_next_link()
+        if not self.has_next or self.last is None:
+            return None
+        return self.encode_cursor(self.last, reverse=False)
+
+    def get_previous_link(self):
+        if not self.ordering:
+            return super().get_previous_link()
+        if not self.has_previous or self.first is None:
+            return None
+        return self.encode_cursor(self.first, reverse=True)
+
+    def get_keyset_ordering(self, view):
+        get_ordering = getattr(view, 'get_keyset_ordering', None)
+        if get_ordering is not None:
+            return get_ordering()
+        return getattr(view, 'keyset_ordering', None)
+
+    # Cursor encoding
+
+    def encode_cursor(self, row, reverse):
+        values = [self._dump(getattr(row, field.lstrip('-'))) for field in self.ordering]
+        payload = json.dumps({'v': values, 'r': reverse}, separators=(',', ':'))
+        cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+        url = remove_query_param(self.base_url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request, model):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            values, reverse = payload['v'], bool(payload['r'])
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError('Wrong number of cursor values')
+            # Values of the wrong type would otherwise fail in the ORM filter
+            values = [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, KeyError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if any(value is None for value in values):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    @staticmethod
+    def _dump(value):
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+
+    # Keyset predicate
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def _after(ordering, values):
+        """Rows strictly after `values` in `ordering`.
+
+        For (a, b, c) that is a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z),
+        with < in place of > for descending fields.
+        """
+        conditions = []
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            q = Q(**{f'{name}__{lookup}': values[index]})
+            for previous, value in zip(ordering[:index], values[:index]):
+                q &= Q(**{previous.lstrip('-'): value})
+            conditions.append(q)
+        return reduce(operator.or_, conditions)
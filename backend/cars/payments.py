@@ -1,13 +1,19 @@
 import stripe
+import logging
 from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
 from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from .models import Booking
+from .models import Booking, StripeEvent
+from . import stripe_client
 
-stripe.api_key = settings.STRIPE_SECRET_KEY
+logger = logging.getLogger(__name__)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -32,7 +38,7 @@ def create_checkout_session(request):
         # Create Stripe checkout session
         frontend_url = request.data.get('frontend_url', 'http://localhost:5173')
         
-        session = stripe.checkout.Session.create(
+        params = dict(
             payment_method_types=['card'],
             line_items=[{
                 'price_data': {
@@ -55,6 +61,10 @@ def create_checkout_session(request):
                 'user_id': request.user.id,
             }
         )
+        # Double submits share one session; an expired session's webhook
+        # touches the booking, so a later retry gets a fresh key
+        idempotency_key = f'checkout-{booking.id}-{booking.updated_at.timestamp()}'
+        session = stripe_client.create_checkout_session(params, idempotency_key)
         
         # Save session ID
         booking.stripe_session_id = session.id
@@ -66,44 +76,70 @@ def create_checkout_session(request):
             'url': session.url
         })
         
+    except stripe.APIConnectionError:
+        # Timed out or unreachable after retries
+        return Response({'error': 'Payment provider unavailable, please try again'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def mark_booking_paid(booking_id, payment_intent_id):
+    """Record a successful payment; calling it again is a no-op"""
+    with transaction.atomic():
+        booking = Booking.objects.select_for_update().get(id=booking_id)
+        if booking.payment_status == 'succeeded':
+            return booking
+        booking.payment_status = 'succeeded'
+        booking.payment_intent_id = payment_intent_id
+        if booking.status in Booking.ACTIVE_STATUSES:
+            booking.status = 'confirmed'
+        else:
+            # Its dates may belong to someone else by now
+            logger.warning('Payment %s received for %s booking %s', payment_intent_id, booking.status, booking.id)
+        booking.save()
+    return booking
+
+
+def payment_state(booking):
+    return {
+        'id': booking.id,
+        'status': booking.status,
+        'payment_status': booking.payment_status
+    }
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def verify_payment(request):
-    """Verify payment after successful checkout"""
+    """Verify payment after successful checkout.
+    
+    Kept for clients that predate the webhook; payment_status below reads
+    the same result without a Stripe round trip.
+    """
     try:
         session_id = request.data.get('session_id')
         
         if not session_id:
             return Response({'error': 'Session ID is required'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Retrieve session from Stripe
-        session = stripe.checkout.Session.retrieve(session_id)
-        
-        # Get booking
-        booking_id = session.metadata.get('booking_id')
-        booking = Booking.objects.get(id=booking_id, user=request.user)
-        
-        if session.payment_status == 'paid':
-            # Update booking
-            booking.payment_status = 'succeeded'
-            booking.status = 'confirmed'
-            booking.payment_intent_id = session.payment_intent
-            booking.save()
+        # The webhook has usually recorded the payment already
+        booking = Booking.objects.filter(stripe_session_id=session_id, user=request.user).first()
+        if booking is None or booking.payment_status != 'succeeded':
+            # Retrieve session from Stripe
+            session = stripe_client.retrieve_checkout_session(session_id)
             
-            return Response({
-                'message': 'Payment successful',
-                'booking': {
-                    'id': booking.id,
-                    'status': booking.status,
-                    'payment_status': booking.payment_status
-                }
-            })
-        else:
-            return Response({'error': 'Payment not completed'}, status=status.HTTP_400_BAD_REQUEST)
+            # Get booking
+            booking_id = session.metadata.get('booking_id')
+            booking = Booking.objects.get(id=booking_id, user=request.user)
+            
+            if session.payment_status != 'paid':
+                return Response({'error': 'Payment not completed'}, status=status.HTTP_400_BAD_REQUEST)
+            booking = mark_booking_paid(booking.id, session.payment_intent)
+        
+        return Response({
+            'message': 'Payment successful',
+            'booking': payment_state(booking)
+        })
             
     except Booking.DoesNotExist:
         return Response({'error': 'Booking not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -111,6 +147,99 @@ def verify_payment(request):
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def payment_status(request):
+    """Payment state of one of the user's bookings, from the database only"""
+    # GET /api/payments/status/?session_id=cs_... or ?booking_id=1
+    session_id = request.query_params.get('session_id')
+    booking_id = request.query_params.get('booking_id')
+    
+    bookings = Booking.objects.filter(user=request.user)
+    if session_id:
+        booking = bookings.filter(stripe_session_id=session_id).first()
+    elif booking_id and booking_id.isdigit():
+        booking = bookings.filter(id=booking_id).first()
+    else:
+        return Response({'error': 'session_id or booking_id is required'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if booking is None:
+        return Response({'error': 'Booking not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response({'booking': payment_state(booking)})
+
+
+def mark_payment_failed(booking_id, session):
+    Booking.objects.filter(id=booking_id).exclude(payment_status='succeeded').update(payment_status='failed')
+
+
+def reopen_payment(booking_id, session):
+    # The checkout session expired unpaid; the user may start a new one
+    Booking.objects.filter(id=booking_id, payment_status='processing').update(payment_status='pending')
+
+
+def succeed_payment(booking_id, session):
+    mark_booking_paid(booking_id, session.get('payment_intent'))
+
+
+def complete_checkout(booking_id, session):
+    # Delayed payment methods report 'unpaid' here and follow up with
+    # checkout.session.async_payment_succeeded
+    if session.get('payment_status') in ('paid', 'no_payment_required'):
+        succeed_payment(booking_id, session)
+
+
+WEBHOOK_HANDLERS = {
+    'checkout.session.completed': complete_checkout,
+    'checkout.session.async_payment_succeeded': succeed_payment,
+    'checkout.session.async_payment_failed': mark_payment_failed,
+    'checkout.session.expired': reopen_payment,
+}
+
+
+def booking_for_session(session):
+    """Id of the booking a checkout session pays for, or None"""
+    booking_id = (session.get('metadata') or {}).get('booking_id') or session.get('client_reference_id')
+    bookings = Booking.objects.filter(id=booking_id) if str(booking_id or '').isdigit() else Booking.objects.none()
+    booking_id = bookings.values_list('id', flat=True).first()
+    if booking_id is None and session.get('id'):
+        booking_id = Booking.objects.filter(stripe_session_id=session['id']).values_list('id', flat=True).first()
+    return booking_id
+
+
+@csrf_exempt
+@require_POST
+def stripe_webhook(request):
+    """Stripe event receiver; every event is handled at most once"""
+    try:
+        event = stripe.Webhook.construct_event(
+            request.body, request.headers.get('Stripe-Signature', ''), settings.STRIPE_WEBHOOK_SECRET
+        )
+    except (ValueError, stripe.SignatureVerificationError):
+        return HttpResponse(status=400)
+    
+    handler = WEBHOOK_HANDLERS.get(event.type)
+    if handler is None:
+        return HttpResponse(status=200)
+    
+    session = event.data.object
+    booking_id = booking_for_session(session)
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                StripeEvent.objects.create(event_id=event.id, type=event.type, booking_id=booking_id)
+        except IntegrityError:
+            # Redelivery of an event we already handled
+            return HttpResponse(status=200)
+        
+        if booking_id is None:
+            logger.warning('Stripe event %s matches no booking', event.id)
+        else:
+            # An exception rolls back the event row too, and Stripe retries
+            handler(booking_id, session)
+    
+    return HttpResponse(status=200)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_stripe_public_key(request):
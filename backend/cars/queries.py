@@ -0,0 +1,26 @@
+from .models import Car
+
+# Relations CarSerializer renders for every car
+CAR_SELECT_RELATED = ('brand',)
+CAR_PREFETCH_RELATED = ('features', 'images')
+
+
+def catalog_cars(queryset=None, prefetch=CAR_PREFETCH_RELATED):
+    """Cars with brand, features and images loaded up front.
+
+    Rating fields are stored on the car row itself, so serializing any
+    number of cars costs one query for the cars plus one per prefetch.
+    List views pass only the relations their serializer will render.
+    """
+    if queryset is None:
+        queryset = Car.objects.all()
+    return queryset.select_related(*CAR_SELECT_RELATED).prefetch_related(*prefetch)
+
+
+def with_catalog_car(queryset, field='car'):
+    """Same loading strategy for querysets that nest a car (bookings, wishlist)"""
+    return queryset.select_related(
+        *(f'{field}__{name}' for name in CAR_SELECT_RELATED)
+    ).prefetch_related(
+        *(f'{field}__{name}' for name in CAR_PREFETCH_RELATED)
+    )
@@ -0,0 +1,53 @@
+from django.db import transaction
+from django.db.models import Case, When, Value, F, Count, Sum, OuterRef, Subquery, FloatField, IntegerField
+from django.db.models.functions import Cast, Coalesce, Round
+from .models import Car, Review
+from .catalog import bump_catalog_version
+from .response_cache import invalidate
+
+
+def _average_expression():
+    """SQL expression deriving average_rating from the stored sum and count"""
+    return Case(
+        When(review_count=0, then=Value(0.0)),
+        default=Round(Cast(F('rating_sum'), FloatField()) / F('review_count'), 1),
+        output_field=FloatField(),
+    )
+
+
+def apply_rating_delta(car_id, rating_delta, count_delta):
+    """Shift a car's stored review aggregates by the given deltas.
+
+    Both updates run in one transaction so readers never see a sum and
+    count that disagree with the average.
+    """
+    with transaction.atomic():
+        cars = Car.objects.filter(pk=car_id)
+        cars.update(
+            rating_sum=F('rating_sum') + rating_delta,
+            review_count=F('review_count') + count_delta,
+        )
+        cars.update(average_rating=_average_expression())
+        bump_catalog_version()
+        invalidate('cars', f'car:{car_id}')
+
+
+def rebuild_rating_aggregates(car_ids=None):
+    """Recompute stored review aggregates from the reviews table"""
+    reviews = Review.objects.filter(car=OuterRef('pk')).order_by().values('car')
+    total = reviews.annotate(total=Sum('rating')).values('total')
+    count = reviews.annotate(count=Count('id')).values('count')
+
+    cars = Car.objects.all()
+    if car_ids is not None:
+        cars = cars.filter(pk__in=car_ids)
+
+    with transaction.atomic():
+        updated = cars.update(
+            rating_sum=Coalesce(Subquery(total, output_field=IntegerField()), 0),
+            review_count=Coalesce(Subquery(count, output_field=IntegerField()), 0),
+        )
+        cars.update(average_rating=_average_expression())
+        bump_catalog_version()
+        invalidate('cars', 'car-detail')
+    return updated
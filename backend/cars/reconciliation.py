@@ -0,0 +1,98 @@
+"""Bulk reconciliation of unsettled payments against Stripe.
+
+Webhooks (see cars.payments.stripe_webhook) settle payments as they
+happen. This catches whatever they missed, e.g. while the endpoint was
+down or unconfigured. It lists the checkout sessions created in the
+window, 100 per Stripe request, instead of retrieving them one by one.
+The bookings are then locked and re-checked, and every change is written
+with a single bulk_update.
+"""
+import logging
+from datetime import timedelta
+from django.utils import timezone
+from django.db import transaction
+from .models import Booking
+from .revenue import add_booking_revenue
+from .response_cache import invalidate
+from . import stripe_client
+
+logger = logging.getLogger(__name__)
+
+RECONCILED_FIELDS = ['payment_status', 'status', 'payment_intent_id', 'updated_at']
+BOOKING_FIELDS = ('id', 'car_id', 'status', 'payment_status', 'payment_intent_id', 'stripe_session_id', 'total_cost', 'created_at')
+UNSETTLED = ('pending', 'processing')
+
+
+def settle(booking, session):
+    """Apply a session's outcome to booking; returns True if anything changed"""
+    if session.get('payment_status') in ('paid', 'no_payment_required'):
+        booking.payment_status = 'succeeded'
+        booking.payment_intent_id = session.get('payment_intent')
+        if booking.status in Booking.ACTIVE_STATUSES:
+            booking.status = 'confirmed'
+        else:
+            logger.warning('Payment %s received for %s booking %s', booking.payment_intent_id, booking.status, booking.id)
+        return True
+    if session.get('status') == 'expired' and booking.payment_status == 'processing':
+        # Let the user start a new checkout
+        booking.payment_status = 'pending'
+        return True
+    return False
+
+
+def reconcile_payments(since_days=7, dry_run=False):
+    """Settle unpaid bookings created in the last since_days from Stripe.
+
+    Returns {'checked': n, 'sessions': n, 'paid': n, 'expired': n}.
+    """
+    since = timezone.now() - timedelta(days=since_days)
+    unsettled = {
+        booking.stripe_session_id: booking
+        for booking in Booking.objects.filter(
+            payment_status__in=UNSETTLED,
+            stripe_session_id__isnull=False,
+            created_at__gte=since,
+        ).only(*BOOKING_FIELDS)
+    }
+    summary = {'checked': len(unsettled), 'sessions': 0, 'paid': 0, 'expired': 0}
+    if not unsettled:
+        return summary
+
+    # Sessions are created after their booking, so the window covers them
+    sessions = {}
+    for session in stripe_client.list_checkout_sessions(since.timestamp()):
+        summary['sessions'] += 1
+        booking = unsettled.pop(session.id, None)
+        if booking is not None and settle(booking, session):
+            sessions[booking.id] = session
+        if not unsettled:
+            break
+
+    if dry_run or not sessions:
+        for session in sessions.values():
+            summary['paid' if session.get('payment_status') in ('paid', 'no_payment_required') else 'expired'] += 1
+        return summary
+
+    # Listing can take many requests; a webhook, verify_payment or a
+    # cancellation may have changed the bookings since they were read.
+    # Lock them and settle only the ones that are still unsettled.
+    now, changed = timezone.now(), []
+    with transaction.atomic():
+        bookings = Booking.objects.select_for_update().filter(
+            pk__in=sessions, payment_status__in=UNSETTLED,
+        ).only(*BOOKING_FIELDS)
+        for booking in bookings:
+            if settle(booking, sessions[booking.id]):
+                booking.updated_at = now
+                changed.append(booking)
+                summary['paid' if booking.payment_status == 'succeeded' else 'expired'] += 1
+        # bulk_update sends no signals. Only payment fields and pending ->
+        # confirmed change here, so the availability calendar and index
+        # they maintain stay valid; revenue and the dashboard don't.
+        Booking.objects.bulk_update(changed, RECONCILED_FIELDS, batch_size=500)
+        for booking in changed:
+            if booking.payment_status == 'succeeded':
+                add_booking_revenue(booking.car_id, booking.created_at, booking.total_cost)
+    if changed:
+        invalidate('admin-stats')
+    return summary
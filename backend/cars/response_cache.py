@@ -0,0 +1,97 @@
+"""Response cache for read-heavy catalog endpoints.
+
+Cached responses are keyed by host, path and normalized query string,
+plus the current generation of every scope the response depends on:
+
+- cars: car list shapes (list, featured, by_brand)
+- car:<id>: one car's detail
+- car-detail: every car detail (brand / feature renames)
+- brands, features: the brand and feature lists
+- admin-stats: the admin dashboard snapshot (see cars.dashboard)
+
+Signal handlers in cars.signals call invalidate() with the scopes a write
+touches. That swaps the scope's generation token, so every entry built
+on the old token becomes unreachable and ages out of the cache. This
+works with any Django cache backend. The local-memory backend is
+per-process, so with several workers invalidation is only as precise as
+CATALOG_CACHE_TIMEOUT. Use the file-based backend to share entries and
+generations between workers.
+"""
+import hashlib
+import uuid
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+GENERATION_KEY = 'catalog:gen:{}'
+
+
+def _generation_keys(scopes):
+    return {scope: GENERATION_KEY.format(scope) for scope in scopes}
+
+
+def get_generations(scopes):
+    keys = _generation_keys(scopes)
+    found = cache.get_many(keys.values())
+    generations = []
+    for scope, key in keys.items():
+        generation = found.get(key)
+        if generation is None:
+            # Fresh token rather than a counter reset, so an evicted
+            # generation can never match entries built before eviction
+            cache.add(key, uuid.uuid4().hex, None)
+            generation = cache.get(key)
+        generations.append(f'{scope}={generation}')
+    return generations
+
+
+def invalidate(*scopes):
+    """Drop every cached response depending on scopes.
+
+    Runs now and again after commit: a request that read the old rows
+    while the writing transaction was still open may have re-cached them.
+    """
+    def swap_generations():
+        cache.set_many({key: uuid.uuid4().hex for key in _generation_keys(scopes).values()}, None)
+    swap_generations()
+    transaction.on_commit(swap_generations)
+
+
+def normalized_query(params):
+    """Query string with keys and comma-separated values sorted"""
+    parts = []
+    for key in sorted(params):
+        values = []
+        for value in params.getlist(key):
+            values.extend(sorted(item.strip() for item in value.split(',')))
+        parts.append(f'{key}={",".join(values)}')
+    return '&'.join(parts)
+
+
+def cached_response(*scopes):
+    """Cache a GET view's response data under the given scopes.
+
+    Scopes may reference URL kwargs, e.g. 'car:{pk}'.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view_func(request, *args, **kwargs)
+
+            generations = get_generations([scope.format(**kwargs) for scope in scopes])
+            signature = '|'.join([request.get_host(), request.path, normalized_query(request.query_params)] + generations)
+            key = 'catalog:response:' + hashlib.md5(signature.encode()).hexdigest()
+
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+
+            response = view_func(request, *args, **kwargs)
+            if response.status_code == 200 and isinstance(response, Response):
+                cache.set(key, response.data, settings.CATALOG_CACHE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,74 @@
+"""Revenue rollups behind the admin revenue charts.
+
+Each paid booking counts once in its car's day bucket and once in its
+month bucket, keyed by the booking's creation date in the current time
+zone. Booking signals (see cars.signals) add a booking when its payment
+succeeds and take it back out if it is refunded, repriced or deleted.
+Bulk writes call add_booking_revenue() themselves. After changing
+buckets, or to repair drift, run `manage.py rebuild_revenue_rollups`.
+
+Reads cover any date range. Month buckets give whole months only.
+"""
+from django.db import transaction
+from django.db.models import Count, DateField, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+from .models import Booking, RevenueRollup
+
+PERIODS = ('day', 'month')
+GROUPINGS = {'car': 'car', 'brand': 'car__brand'}
+
+
+def buckets(created_at):
+    day = timezone.localdate(created_at)
+    return {'day': day, 'month': day.replace(day=1)}
+
+
+def add_booking_revenue(car_id, created_at, amount, count=1):
+    """Shift the car's day and month buckets by amount and count"""
+    with transaction.atomic():
+        for period, bucket in buckets(created_at).items():
+            rollup, _ = RevenueRollup.objects.get_or_create(period=period, bucket=bucket, car_id=car_id)
+            RevenueRollup.objects.filter(pk=rollup.pk).update(
+                revenue=F('revenue') + amount, bookings=F('bookings') + count,
+            )
+
+
+def rebuild_revenue_rollups():
+    """Recompute every bucket from paid bookings; returns the number of rows written"""
+    paid = Booking.objects.filter(payment_status='succeeded').order_by()
+    rollups = []
+    for period, trunc in (('month', TruncMonth), ('day', TruncDate)):
+        grouped = paid.annotate(bucket=trunc('created_at', output_field=DateField())).values('bucket', 'car_id').annotate(
+            revenue=Sum('total_cost'), count=Count('id'),
+        )
+        rollups += [
+            RevenueRollup(period=period, bucket=row['bucket'], car_id=row['car_id'], revenue=row['revenue'], bookings=row['count'])
+            for row in grouped
+        ]
+    with transaction.atomic():
+        RevenueRollup.objects.all().delete()
+        RevenueRollup.objects.bulk_create(rollups, batch_size=1000)
+    return len(rollups)
+
+
+def revenue_series(start, end, period='month', by=None):
+    """Revenue and bookings per bucket in [start, end], optionally per car or brand.
+
+    Rows are dicts with bucket, revenue, bookings and, with by, the car
+    or brand id, ordered by bucket.
+    """
+    fields = ['bucket'] + ([GROUPINGS[by]] if by else [])
+    rows = (
+        RevenueRollup.objects.filter(period=period, bucket__gte=start, bucket__lte=end)
+        .values(*fields).annotate(total=Sum('revenue'), count=Sum('bookings')).order_by(*fields)
+    )
+    return [
+        {
+            'bucket': row['bucket'],
+            **({by: row[GROUPINGS[by]]} if by else {}),
+            'revenue': row['total'],
+            'bookings': row['count'],
+        }
+        for row in rows
+    ]
@@ -0,0 +1,138 @@
+"""Full-text search over cars.
+
+Each car is indexed as one document made of its name, brand name,
+feature names, color and description, weighted in that order.
+
+- PostgreSQL: Car.search_vector holds a weighted tsvector with a GIN
+  index, ranked with ts_rank.
+- SQLite: an FTS5 shadow table (cars_car_fts, rowid = car id) ranked
+  with bm25.
+- Anything else falls back to icontains matching without ranking.
+
+On both PostgreSQL and SQLite a query matches cars containing every one
+of its words, each as a prefix, so ?q=elec finds "electric" on either.
+
+The index is refreshed by the signal handlers in cars.signals and can be
+rebuilt with `manage.py rebuild_search_index`.
+"""
+import re
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F, Q
+from .models import Car
+
+FTS_TABLE = 'cars_car_fts'
+
+# Column order of the FTS5 table and the weight each column gets
+DOCUMENT_COLUMNS = ('name', 'brand', 'features', 'color', 'description')
+POSTGRES_WEIGHTS = ('A', 'A', 'B', 'C', 'D')
+BM25_WEIGHTS = (10.0, 8.0, 4.0, 2.0, 1.0)
+
+SEARCH_CONFIG = 'english'
+
+
+def car_documents(car_ids):
+    """(id, name, brand, features, color, description) rows for the given cars"""
+    cars = Car.objects.filter(pk__in=car_ids).select_related('brand').prefetch_related('features')
+    return [
+        (
+            car.id,
+            car.name,
+            car.brand.name if car.brand else '',
+            ' '.join(feature.name for feature in car.features.all()),
+            car.color,
+            car.description,
+        )
+        for car in cars
+    ]
+
+
+def write_documents(car_ids, documents, using=connection):
+    """Replace the index entries for car_ids with documents.
+
+    Cars in car_ids without a document (deleted cars) are dropped from the
+    index. Takes plain tuples so migrations can call it with rows built
+    from historical models.
+    """
+    car_ids = list(car_ids)
+    if using.vendor == 'sqlite':
+        with using.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(car_id,) for car_id in car_ids])
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, {", ".join(DOCUMENT_COLUMNS)}) VALUES (%s, %s, %s, %s, %s, %s)',
+                documents,
+            )
+    elif using.vendor == 'postgresql':
+        with using.cursor() as cursor:
+            vector = ' || '.join(
+                f"setweight(to_tsvector('{SEARCH_CONFIG}', %s), '{weight}')" for weight in POSTGRES_WEIGHTS
+            )
+            cursor.executemany(
+                f'UPDATE cars_car SET search_vector = {vector} WHERE id = %s',
+                [document[1:] + (document[0],) for document in documents],
+            )
+
+
+def update_search_index(car_ids):
+    car_ids = list(car_ids)
+    if car_ids:
+        write_documents(car_ids, car_documents(car_ids))
+
+
+def rebuild_search_index():
+    car_ids = list(Car.objects.values_list('id', flat=True))
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    write_documents(car_ids, car_documents(car_ids))
+    return len(car_ids)
+
+
+def _terms(q):
+    # Plain words only, so user input can't inject FTS5 or tsquery syntax
+    return re.findall(r'\w+', q)
+
+
+def _fts5_query(q):
+    # Every term must match; the trailing * gives prefix matching for
+    # search-as-you-type
+    return ' '.join(f'"{term}"*' for term in _terms(q))
+
+
+def _tsquery(q):
+    # Same semantics as _fts5_query: every term, each as a prefix
+    return ' & '.join(f"'{term}':*" for term in _terms(q))
+
+
+def search_cars(queryset, q):
+    """Cars matching q, ordered by relevance (best first)"""
+    q = q.strip()
+    if not q:
+        return queryset
+
+    if connection.vendor == 'postgresql':
+        tsquery = _tsquery(q)
+        if not tsquery:
+            return queryset.none()
+        query = SearchQuery(tsquery, search_type='raw', config=SEARCH_CONFIG)
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).order_by('-rank', 'id')
+
+    if connection.vendor == 'sqlite':
+        match = _fts5_query(q)
+        if not match:
+            return queryset.none()
+        weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+        # bm25() is lower for better matches
+        return queryset.extra(
+            select={'rank': f'bm25({FTS_TABLE}, {weights})'},
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = cars_car.id', f'{FTS_TABLE} MATCH %s'],
+            params=[match],
+        ).order_by('rank', 'id')
+
+    return queryset.filter(
+        Q(name__icontains=q) | Q(description__icontains=q) | Q(color__icontains=q)
+        | Q(brand__name__icontains=q) | Q(features__name__icontains=q)
+    ).distinct()
@@ -1,56 +1,125 @@
 from .models import Car, Feature, Brand, CarImage, Booking, Review, Wishlist, ContactMessage, Newsletter
 from rest_framework import serializers
+from .images import srcset
 
-class FeatureSerializer(serializers.ModelSerializer):
+
+def query_param_set(request, name):
+    """Comma-separated query parameter as a set, e.g. ?expand=features,images"""
+    if request is None:
+        return set()
+    value = request.query_params.get(name, '')
+    return {item.strip() for item in value.split(',') if item.strip()}
+
+
+class SparseFieldsMixin:
+    """Lets GET requests trim or extend the fields a serializer returns.
+
+    ?fields=id,name,price_per_day keeps only the listed fields, and
+    ?expand=features adds fields named in Meta.expandable_fields, a dict
+    of name -> (field class, kwargs). Only the top-level serializer of a
+    response reacts, so nested serializers keep their full shape.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method != 'GET' or not self._is_root():
+            return fields
+
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        for name in query_param_set(request, 'expand') & set(expandable):
+            field_class, kwargs = expandable[name]
+            fields[name] = field_class(**kwargs)
+
+        requested = query_param_set(request, 'fields')
+        if requested:
+            fields = {name: field for name, field in fields.items() if name in requested}
+        return fields
+
+    def _is_root(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+
+class ImageURLsMixin:
+    """image / srcset from the URLs stored at save time (see cars.images).
+
+    Rows saved before those URLs existed fall back to building the
+    original URL on the fly.
+    """
+
+    def get_image(self, obj):
+        if obj.image_urls:
+            return obj.image_urls.get('original')
+        if obj.image:
+            return obj.image.url  # Full Cloudinary URL
+        return None
+
+    def get_srcset(self, obj):
+        return srcset(obj.image_urls)
+
+
+class FeatureSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Feature
         fields = ['id', 'name']
         
-class BrandSerializer(serializers.ModelSerializer):
+class BrandSerializer(ImageURLsMixin, SparseFieldsMixin, serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
     class Meta:
         
         model = Brand
-        fields = ['id', 'name', 'image']
-        
-    def get_image(self, obj):
-        if obj.image:
-            return obj.image.url  # This gets the full Cloudinary URL
-        return None
+        fields = ['id', 'name', 'image', 'srcset']
         
-class CarImageSerializer(serializers.ModelSerializer):
+class CarImageSerializer(ImageURLsMixin, SparseFieldsMixin, serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = CarImage
-        fields = ['id', 'image']
-        
-    def get_image(self, obj):
-        if obj.image:
-            return obj.image.url  # Full Cloudinary URL
-        return None
+        fields = ['id', 'image', 'srcset']
 
-class CarSerializer(serializers.ModelSerializer):
+class CarSerializer(ImageURLsMixin, SparseFieldsMixin, serializers.ModelSerializer):
     features = FeatureSerializer(many=True, read_only=True)
     brand = BrandSerializer(read_only=True)
     images = CarImageSerializer(many=True, read_only=True)
-    average_rating = serializers.ReadOnlyField()
-    review_count = serializers.ReadOnlyField()  
+    average_rating = serializers.FloatField(read_only=True)
+    review_count = serializers.IntegerField(read_only=True)
     image = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = Car
-        fields = '__all__'
-        
-    def get_image(self, obj):
-        if obj.image:
-            return obj.image.url  # Full Cloudinary URL
-        return None
+        exclude = ['rating_sum', 'search_vector', 'image_urls']
+
+
+class CarListSerializer(CarSerializer):
+    """Compact car shape for catalog grids.
+
+    Leaves out the description, features and gallery images; clients that
+    need them ask with ?expand=description,features,images.
+    """
+
+    class Meta:
+        model = Car
+        fields = [
+            'id', 'name', 'brand', 'year', 'price_per_day', 'car_type', 'transmission',
+            'fuel_type', 'image', 'srcset', 'color', 'horsepower', 'speed', 'time',
+            'is_available', 'featured', 'average_rating', 'review_count',
+        ]
+        expandable_fields = {
+            'description': (serializers.CharField, {'read_only': True}),
+            'features': (FeatureSerializer, {'many': True, 'read_only': True}),
+            'images': (CarImageSerializer, {'many': True, 'read_only': True}),
+        }
         
 
 
 
-class BookingSerializer(serializers.ModelSerializer):
+class BookingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     car = CarSerializer(read_only=True)
     car_id = serializers.IntegerField(write_only=True)
     user_username = serializers.CharField(source='user.username', read_only=True)
@@ -73,12 +142,56 @@ class BookingSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['user', 'created_at', 'updated_at']
     
+    def validate(self, attrs):
+        pickup_date = attrs.get('pickup_date', getattr(self.instance, 'pickup_date', None))
+        return_date = attrs.get('return_date', getattr(self.instance, 'return_date', None))
+        if pickup_date and return_date and return_date <= pickup_date:
+            raise serializers.ValidationError({'return_date': 'Return date must be after pickup date'})
+        return attrs
+    
     def create(self, validated_data):
         # Automatically set the user from request
         validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
     
-class ReviewSerializer(serializers.ModelSerializer):
+class CarImportSerializer(serializers.ModelSerializer):
+    """One row of a fleet import (see cars.fleet_import), validated without touching the database.
+
+    The brand and features are given by name, and the car image and gallery images
+    by Cloudinary public id.
+    """
+    brand = serializers.CharField(required=False, allow_blank=True)
+    image = serializers.CharField(required=False, allow_blank=True)
+    features = serializers.ListField(child=serializers.CharField(max_length=255), required=False)
+    images = serializers.ListField(child=serializers.CharField(max_length=255), required=False)
+    
+    class Meta:
+        model = Car
+        fields = [
+            'name', 'brand', 'year', 'price_per_day', 'car_type', 'description', 'transmission',
+            'fuel_type', 'image', 'color', 'license_plate', 'features', 'images', 'speed', 'time',
+            'horsepower', 'is_available', 'featured',
+        ]
+        
+        
+class AdminBookingSerializer(serializers.ModelSerializer):
+    """Compact booking row for the admin listing: the car's id and name only"""
+    car = serializers.SerializerMethodField()
+    user_username = serializers.CharField(source='user.username', read_only=True)
+    
+    class Meta:
+        model = Booking
+        fields = [
+            'id', 'user', 'user_username', 'car', 'pickup_date', 'return_date',
+            'total_days', 'total_cost', 'status', 'payment_status', 'created_at',
+        ]
+        read_only_fields = fields
+    
+    def get_car(self, booking):
+        return {'id': booking.car_id, 'name': booking.car.name}
+    
+    
+class ReviewSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user_username = serializers.CharField(source='user.username', read_only=True)
     car_name = serializers.CharField(source='car.name', read_only=True)
     
@@ -92,7 +205,7 @@ class ReviewSerializer(serializers.ModelSerializer):
         validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
     
-class WishlistSerializer(serializers.ModelSerializer):
+class WishlistSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     car = CarSerializer(read_only=True)
     car_id = serializers.IntegerField(write_only=True)
     
@@ -0,0 +1,199 @@
+from django.db.models.signals import pre_save, post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+from .models import Car, Brand, Feature, CarImage, Booking, Review
+from .search import update_search_index
+from .catalog import bump_catalog_version
+from .response_cache import invalidate
+from .images import store_image_urls
+from .booking_calendar import invalidate_calendar
+from .availability_index import refresh_availability
+from .revenue import add_booking_revenue
+
+
+# Catalog version (ETag / Last-Modified)
+
+@receiver(post_save, sender=Car)
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Feature)
+@receiver(post_save, sender=CarImage)
+@receiver(post_delete, sender=Car)
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=Feature)
+@receiver(post_delete, sender=CarImage)
+def catalog_changed(sender, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(m2m_changed, sender=Car.features.through)
+def catalog_features_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_catalog_version()
+
+
+# Response cache (see cars.response_cache for the scopes)
+
+@receiver(post_save, sender=Car)
+@receiver(post_delete, sender=Car)
+def invalidate_car(sender, instance, **kwargs):
+    invalidate('cars', f'car:{instance.pk}')
+
+
+@receiver(post_save, sender=CarImage)
+@receiver(post_delete, sender=CarImage)
+def invalidate_car_image(sender, instance, **kwargs):
+    invalidate('cars', f'car:{instance.car_id}')
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+def invalidate_brand(sender, **kwargs):
+    invalidate('brands', 'cars', 'car-detail')
+
+
+@receiver(post_save, sender=Feature)
+@receiver(post_delete, sender=Feature)
+def invalidate_feature(sender, **kwargs):
+    invalidate('features', 'cars', 'car-detail')
+
+
+@receiver(m2m_changed, sender=Car.features.through)
+def invalidate_car_features(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        invalidate('cars', f'car:{instance.pk}')
+    elif pk_set is not None:
+        invalidate('cars', *(f'car:{car_id}' for car_id in pk_set))
+    else:
+        invalidate('cars', 'car-detail')
+
+
+@receiver(post_save, sender=Car)
+@receiver(post_delete, sender=Car)
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_admin_stats(sender, **kwargs):
+    invalidate('admin-stats')
+
+
+# Stored image URLs
+
+@receiver(post_save, sender=Car)
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=CarImage)
+def update_image_urls(sender, instance, **kwargs):
+    store_image_urls(instance)
+
+
+# Search index
+
+@receiver(post_save, sender=Car)
+@receiver(post_delete, sender=Car)
+def reindex_car(sender, instance, **kwargs):
+    update_search_index([instance.pk])
+
+
+@receiver(m2m_changed, sender=Car.features.through)
+def reindex_car_features(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # feature.cars.add(...) - instance is a Feature, pk_set holds car ids
+        car_ids = pk_set if pk_set is not None else instance.cars.values_list('id', flat=True)
+    else:
+        car_ids = [instance.pk]
+    update_search_index(car_ids)
+
+
+@receiver(post_save, sender=Brand)
+def reindex_brand_cars(sender, instance, created, **kwargs):
+    if not created:
+        update_search_index(instance.car_set.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Feature)
+def reindex_feature_cars(sender, instance, created, **kwargs):
+    if not created:
+        update_search_index(instance.cars.values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=Brand)
+@receiver(pre_delete, sender=Feature)
+def remember_affected_cars(sender, instance, **kwargs):
+    # Deleting a brand or feature changes cars through SET_NULL / through-row
+    # deletes, which send no signals of their own
+    related = instance.car_set if sender is Brand else instance.cars
+    instance._affected_car_ids = list(related.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=Feature)
+def reindex_affected_cars(sender, instance, **kwargs):
+    update_search_index(getattr(instance, '_affected_car_ids', []))
+
+
+# Booking state before a save, for the handlers below
+
+BOOKED_FIELDS = ('car_id', 'pickup_date', 'return_date', 'status')
+PAYMENT_FIELDS = ('payment_status', 'total_cost')
+
+
+@receiver(pre_save, sender=Booking)
+def remember_saved_booking(sender, instance, **kwargs):
+    instance._saved = None
+    if instance.pk:
+        instance._saved = Booking.objects.filter(pk=instance.pk).values(*BOOKED_FIELDS, *PAYMENT_FIELDS).first()
+
+
+# Availability calendar and index (see cars.booking_calendar, cars.availability_index)
+
+def changed_date_ranges(instance):
+    """{car_id: [(pickup, return_date), ...]} whose availability a save changed"""
+    saved = getattr(instance, '_saved', None)
+    if saved and all(saved[field] == getattr(instance, field) for field in BOOKED_FIELDS):
+        # e.g. a payment status update
+        return {}
+    changed = {instance.car_id: [(instance.pickup_date, instance.return_date)]}
+    if saved:
+        changed.setdefault(saved['car_id'], []).append((saved['pickup_date'], saved['return_date']))
+    return changed
+
+
+@receiver(post_save, sender=Booking)
+def booking_dates_changed(sender, instance, **kwargs):
+    for car_id, date_ranges in changed_date_ranges(instance).items():
+        invalidate_calendar(car_id, *date_ranges)
+        refresh_availability(car_id, *date_ranges)
+
+
+@receiver(post_delete, sender=Booking)
+def booking_dates_freed(sender, instance, **kwargs):
+    date_range = (instance.pickup_date, instance.return_date)
+    invalidate_calendar(instance.car_id, date_range)
+    refresh_availability(instance.car_id, date_range)
+
+
+# Revenue rollups (see cars.revenue)
+
+@receiver(post_save, sender=Booking)
+def booking_revenue_changed(sender, instance, **kwargs):
+    saved = getattr(instance, '_saved', None)
+    was_paid = bool(saved) and saved['payment_status'] == 'succeeded'
+    is_paid = instance.payment_status == 'succeeded'
+    if was_paid and is_paid and saved['car_id'] == instance.car_id and saved['total_cost'] == instance.total_cost:
+        return
+    if was_paid:
+        add_booking_revenue(saved['car_id'], instance.created_at, -saved['total_cost'], -1)
+    if is_paid:
+        add_booking_revenue(instance.car_id, instance.created_at, instance.total_cost)
+
+
+@receiver(post_delete, sender=Booking)
+def booking_revenue_removed(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Car) or getattr(origin, 'model', None) is Car:
+        # The car's rollups are being deleted along with it
+        return
+    if instance.payment_status == 'succeeded':
+        add_booking_revenue(instance.car_id, instance.created_at, -instance.total_cost, -1)
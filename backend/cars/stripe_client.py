@@ -0,0 +1,119 @@
+"""Stripe API access for cars.payments.
+
+One StripeClient per process, built on a pooled requests session with
+connect and read timeouts from settings, instead of the global stripe
+module's defaults (80 s timeouts, no retries). Failed calls are retried
+up to STRIPE_MAX_RETRIES times. Writes carry an idempotency key, so a
+retried request can never create a second checkout session. Async
+variants of each call go over an httpx pool, for ASGI views.
+
+Every call's latency is recorded per operation. stripe_latency() gives
+percentiles for this process, and calls slower than
+STRIPE_SLOW_CALL_SECONDS are logged as warnings.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+import requests
+import stripe
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+LATENCY_SAMPLES = 500
+
+
+@lru_cache(maxsize=None)
+def get_client():
+    timeout = (settings.STRIPE_CONNECT_TIMEOUT, settings.STRIPE_READ_TIMEOUT)
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.STRIPE_POOL_SIZE)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    http_client = stripe.RequestsClient(
+        timeout=timeout,
+        session=session,
+        async_fallback_client=stripe.HTTPXClient(timeout=sum(timeout)),
+    )
+    return stripe.StripeClient(
+        settings.STRIPE_SECRET_KEY,
+        http_client=http_client,
+        max_network_retries=settings.STRIPE_MAX_RETRIES,
+        base_addresses={'api': settings.STRIPE_API_BASE},
+    )
+
+
+# Latency metrics
+
+_latencies = {}
+_latencies_lock = threading.Lock()
+
+
+def record_latency(operation, seconds):
+    with _latencies_lock:
+        _latencies.setdefault(operation, deque(maxlen=LATENCY_SAMPLES)).append(seconds)
+    if seconds > settings.STRIPE_SLOW_CALL_SECONDS:
+        logger.warning('Slow Stripe call %s: %.2f s', operation, seconds)
+
+
+@contextmanager
+def timed(operation):
+    began = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_latency(operation, time.perf_counter() - began)
+
+
+def stripe_latency():
+    """{operation: {'count', 'p50_ms', 'p95_ms', 'max_ms'}} over recent calls in this process"""
+    with _latencies_lock:
+        samples = {operation: sorted(values) for operation, values in _latencies.items()}
+    return {
+        operation: {
+            'count': len(values),
+            'p50_ms': round(values[len(values) // 2] * 1000, 1),
+            'p95_ms': round(values[max(int(len(values) * 0.95) - 1, 0)] * 1000, 1),
+            'max_ms': round(values[-1] * 1000, 1),
+        }
+        for operation, values in samples.items()
+    }
+
+
+# API calls
+
+def create_checkout_session(params, idempotency_key):
+    with timed('checkout.sessions.create'):
+        return get_client().v1.checkout.sessions.create(params, {'idempotency_key': idempotency_key})
+
+
+async def create_checkout_session_async(params, idempotency_key):
+    with timed('checkout.sessions.create'):
+        return await get_client().v1.checkout.sessions.create_async(params, {'idempotency_key': idempotency_key})
+
+
+def retrieve_checkout_session(session_id):
+    with timed('checkout.sessions.retrieve'):
+        return get_client().v1.checkout.sessions.retrieve(session_id)
+
+
+async def retrieve_checkout_session_async(session_id):
+    with timed('checkout.sessions.retrieve'):
+        return await get_client().v1.checkout.sessions.retrieve_async(session_id)
+
+
+def list_checkout_sessions(created_gte, page_size=100):
+    """Every checkout session created at or after the timestamp, newest first, a page per request"""
+    params = {'created': {'gte': int(created_gte)}, 'limit': page_size}
+    while True:
+        with timed('checkout.sessions.list'):
+            page = get_client().v1.checkout.sessions.list(params)
+        yield from page.data
+        if not page.has_more:
+            return
+        params['starting_after'] = page.data[-1].id
@@ -1,3 +1,1396 @@
-from django.test import TestCase
+import base64
+import io
+import hashlib
+import hmac
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+import cloudinary
+from unittest import mock
+from datetime import date, timedelta
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from .models import Car, Feature, Brand, CarImage, Booking, Review, Wishlist, EmailOutbox, Newsletter, NewsletterCampaign, StripeEvent, RevenueRollup
+from .pagination import KeysetPagination
+from . import availability_index, search
+from .outbox import deliver_outbox
+from .newsletter import CampaignInProgress, claim_campaign, send_campaign
+from . import stripe_client
+from .reconciliation import reconcile_payments
+from .revenue import rebuild_revenue_rollups
+from .fleet_import import import_fleet
+
+# Cloudinary refuses to build URLs without a cloud name
+cloudinary.config(cloud_name='test')
+
+
+def make_car(brand, features=(), images=0, **kwargs):
+    fields = {
+        'name': 'Test Car',
+        'brand': brand,
+        'year': 2024,
+        'price_per_day': 100,
+        'car_type': 'Sedan',
+        'description': 'A test car',
+        'transmission': 'Automatic',
+        'fuel_type': 'Petrol',
+    }
+    fields.update(kwargs)
+    car = Car.objects.create(**fields)
+    car.features.set(features)
+    for i in range(images):
+        CarImage.objects.create(car=car, image=f'cars/related/test-{car.id}-{i}')
+    return car
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class APITestCase(TestCase):
+    def setUp(self):
+        # Cached catalog responses must not leak between tests
+        cache.clear()
+        self.client = APIClient()
+
+
+class CatalogQueryBudgetTests(APITestCase):
+    """Car-returning endpoints must cost the same number of queries for any page size"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('renter', password='password123')
+        self.brand = Brand.objects.create(name='Brand', image='cars/related/brand')
+        self.features = [Feature.objects.create(name=f'Feature {i}') for i in range(3)]
+
+    def add_cars(self, count):
+        cars = [
+            make_car(self.brand, self.features, images=2, featured=True)
+            for _ in range(count)
+        ]
+        for car in cars:
+            Booking.objects.create(
+                user=self.user, car=car,
+                pickup_date=date.today(), return_date=date.today() + timedelta(days=2),
+                total_days=2, total_cost=200,
+            )
+            Wishlist.objects.create(user=self.user, car=car)
+        return cars
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertConstantQueries(self, url, budget):
+        self.add_cars(2)
+        small = self.count_queries(url)
+        self.add_cars(6)
+        large = self.count_queries(url)
+        self.assertEqual(small, large, f'{url} query count grows with result size')
+        self.assertLessEqual(large, budget)
+
+    def test_car_list(self):
+        # catalog stamp, count, cars (brand joined)
+        self.assertConstantQueries('/api/cars/', 3)
+
+    def test_car_list_expanded(self):
+        # catalog stamp, count, cars, features, images
+        self.assertConstantQueries('/api/cars/?expand=features,images', 5)
+
+    def test_car_detail(self):
+        car = self.add_cars(1)[0]
+        self.assertLessEqual(self.count_queries(f'/api/cars/{car.id}/'), 4)
+
+    def test_featured(self):
+        self.assertConstantQueries('/api/cars/featured/', 2)
+
+    def test_by_brand(self):
+        self.assertConstantQueries(f'/api/brands/by_brand/?brand_id={self.brand.id}', 2)
+
+    def test_bookings(self):
+        self.client.force_authenticate(self.user)
+        self.assertConstantQueries('/api/bookings/', 4)
+
+    def test_wishlist(self):
+        self.client.force_authenticate(self.user)
+        self.assertConstantQueries('/api/wishlist/', 4)
+
+
+class CarFilterTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        brand = Brand.objects.create(name='Brand', image='cars/related/brand')
+        self.suv = make_car(brand, name='SUV', car_type='SUV', price_per_day=150, year=2022)
+        self.sedan = make_car(brand, name='Sedan', car_type='Sedan', price_per_day=80, year=2024, fuel_type='Diesel')
+        self.ev = make_car(brand, name='EV', car_type='Hatchback', price_per_day=60, year=2025, fuel_type='Electric', is_available=False)
+
+    def names(self, query):
+        response = self.client.get(f'/api/cars/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return [car['name'] for car in response.data['results']]
+
+    def test_choice_and_range_filters(self):
+        self.assertEqual(self.names('car_type=SUV,Sedan&ordering=price_per_day'), ['Sedan', 'SUV'])
+        self.assertEqual(self.names('min_price=70&max_price=100'), ['Sedan'])
+        self.assertEqual(self.names('min_year=2024&is_available=true'), ['Sedan'])
+
+    def test_ordering(self):
+        self.assertEqual(self.names('ordering=-year'), ['EV', 'Sedan', 'SUV'])
+
+    def test_invalid_values_are_rejected(self):
+        self.assertEqual(self.client.get('/api/cars/?car_type=Truck').status_code, 400)
+        self.assertEqual(self.client.get('/api/cars/?min_price=cheap').status_code, 400)
+        self.assertEqual(self.client.get('/api/cars/?ordering=license_plate').status_code, 400)
+        self.assertEqual(self.client.get('/api/cars/?ordering=--year').status_code, 400)
+
+
+class CarFacetTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        brand = Brand.objects.create(name='Brand', image='cars/related/brand')
+        gps = Feature.objects.create(name='GPS')
+        make_car(brand, [gps], car_type='SUV', price_per_day=150)
+        make_car(brand, [gps], car_type='SUV', price_per_day=40, fuel_type='Electric')
+        make_car(brand, car_type='Sedan', price_per_day=90)
+
+    def test_counts_follow_filters(self):
+        # catalog stamp + three aggregate queries
+        with self.assertNumQueries(4):
+            facets = self.client.get('/api/cars/facets/?car_type=SUV').data
+        self.assertEqual(facets['total'], 2)
+        self.assertEqual({row['value']: row['count'] for row in facets['fuel_type']}['Electric'], 1)
+        self.assertEqual(facets['features'], [{'id': facets['features'][0]['id'], 'name': 'GPS', 'count': 2}])
+        self.assertEqual([row['count'] for row in facets['price']], [1, 0, 1, 0, 0])
+
+    def test_cached_per_signature(self):
+        self.client.get('/api/cars/facets/?brand=1,2&car_type=SUV')
+        with self.assertNumQueries(1):
+            self.client.get('/api/cars/facets/?car_type=SUV&brand=2,1')
+
+    def test_catalog_write_invalidates(self):
+        self.assertEqual(self.client.get('/api/cars/facets/').data['total'], 3)
+        make_car(None)
+        self.assertEqual(self.client.get('/api/cars/facets/').data['total'], 4)
+
+
+class CarSearchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.brand = Brand.objects.create(name='Tesla', image='cars/related/tesla')
+        self.autopilot = Feature.objects.create(name='Autopilot')
+        make_car(self.brand, [self.autopilot], name='Model S', description='Electric saloon', fuel_type='Electric')
+        make_car(None, name='Golf', description='Compact hatchback with a Tesla-beating boot', color='Red')
+        make_car(None, name='Corolla', description='Reliable commuter')
+
+    def names(self, q):
+        response = self.client.get('/api/cars/', {'q': q})
+        self.assertEqual(response.status_code, 200)
+        return [car['name'] for car in response.data['results']]
+
+    def test_matches_across_fields_ranked(self):
+        # Brand name outranks a passing mention in a description
+        self.assertEqual(self.names('tesla'), ['Model S', 'Golf'])
+        self.assertEqual(self.names('autopilot'), ['Model S'])
+        self.assertEqual(self.names('red'), ['Golf'])
+        self.assertEqual(self.names('commut'), ['Corolla'])
+
+    def test_index_follows_related_changes(self):
+        self.brand.name = 'Polestar'
+        self.brand.save()
+        self.assertEqual(self.names('polestar'), ['Model S'])
+        self.autopilot.delete()
+        self.assertEqual(self.names('autopilot'), [])
+
+    def test_prefix_queries_match_on_every_backend(self):
+        self.assertEqual(self.names('elec sal'), ['Model S'])
+        self.assertEqual(self.names('"); drop'), [])
+        # PostgreSQL gets the same all-terms, prefix query as FTS5
+        self.assertEqual(search._tsquery("elec o'brien"), "'elec':* & 'o':* & 'brien':*")
+        self.assertEqual(search._fts5_query("elec o'brien"), '"elec"* "o"* "brien"*')
+
+    def test_combines_with_filters(self):
+        response = self.client.get('/api/cars/', {'q': 'tesla', 'fuel_type': 'Petrol'})
+        self.assertEqual([car['name'] for car in response.data['results']], ['Golf'])
+
+
+@mock.patch.object(KeysetPagination, 'page_size', 3)
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        brand = Brand.objects.create(name='Brand', image='cars/related/brand')
+        self.cars = [make_car(brand, name=f'Car {i}', featured=i % 3 == 0, price_per_day=50 + i % 4) for i in range(8)]
+
+    def walk(self, url):
+        ids, pages = [], []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            pages.append(response.data)
+            ids += [car['id'] for car in response.data['results']]
+            url = response.data['next']
+        return ids, pages
+
+    def test_walks_every_row_once_in_order(self):
+        ids, pages = self.walk('/api/cars/?pagination=cursor')
+        expected = sorted(self.cars, key=lambda car: (not car.featured, -car.id))
+        self.assertEqual(ids, [car.id for car in expected])
+        self.assertEqual(len(pages), 3)
+
+    def test_ordering_with_ties(self):
+        ids, _ = self.walk('/api/cars/?pagination=cursor&ordering=price_per_day')
+        expected = sorted(self.cars, key=lambda car: (car.price_per_day, car.id))
+        self.assertEqual(ids, [car.id for car in expected])
+
+    def test_previous_link(self):
+        first = self.client.get('/api/cars/?pagination=cursor').data
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+        self.assertEqual(back['results'], first['results'])
+
+    def test_page_numbers_by_default(self):
+        self.assertEqual(self.client.get('/api/cars/').data['count'], 8)
+        self.assertEqual(self.client.get('/api/cars/?cursor=garbage').status_code, 404)
+
+    def test_cursor_values_of_the_wrong_type(self):
+        def encode(values):
+            return base64.urlsafe_b64encode(json.dumps({'v': values, 'r': False}).encode()).decode()
+
+        for values in (['yes', 'abc'], [True, 'abc'], [True, None], [True]):
+            response = self.client.get('/api/cars/', {'cursor': encode(values)})
+            self.assertEqual(response.status_code, 404, values)
+        response = self.client.get('/api/cars/', {'cursor': encode(['2026-01-01T00:00', 5]), 'ordering': 'year'})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.get('/api/cars/', {'cursor': encode([True, '999'])}).status_code, 200)
+
+
+class SparseFieldsetTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        brand = Brand.objects.create(name='Brand', image='cars/related/brand')
+        self.car = make_car(brand, [Feature.objects.create(name='GPS')], images=1)
+
+    def test_list_is_compact(self):
+        car = self.client.get('/api/cars/').data['results'][0]
+        self.assertNotIn('description', car)
+        self.assertNotIn('images', car)
+        self.assertIn('average_rating', car)
+
+    def test_expand_and_fields(self):
+        car = self.client.get('/api/cars/?expand=features,description&fields=id,features,description').data['results'][0]
+        self.assertEqual(set(car), {'id', 'features', 'description'})
+        self.assertEqual(car['features'][0]['name'], 'GPS')
+
+    def test_detail_keeps_full_shape(self):
+        car = self.client.get(f'/api/cars/{self.car.id}/').data
+        self.assertIn('description', car)
+        self.assertEqual(len(car['images']), 1)
+        trimmed = self.client.get(f'/api/cars/{self.car.id}/?fields=id,name').data
+        self.assertEqual(set(trimmed), {'id', 'name'})
+
+
+class ConditionalCatalogTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('reviewer', password='password123')
+        self.brand = Brand.objects.create(name='Brand', image='cars/related/brand')
+        self.car = make_car(self.brand)
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_not_modified_without_serializing(self):
+        for url in ['/api/cars/', f'/api/cars/{self.car.id}/', '/api/cars/featured/',
+                    '/api/brands/', '/api/features/', f'/api/brands/by_brand/?brand_id={self.brand.id}']:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            with self.assertNumQueries(1):
+                self.assertEqual(self.revalidate(url, response['ETag']).status_code, 304)
+
+    def test_last_modified(self):
+        response = self.client.get('/api/cars/')
+        again = self.client.get('/api/cars/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(again.status_code, 304)
+
+    def test_writes_change_the_etag(self):
+        etag = self.client.get('/api/cars/')['ETag']
+        self.brand.name = 'Renamed'
+        self.brand.save()
+        self.assertEqual(self.revalidate('/api/cars/', etag).status_code, 200)
+
+        etag = self.client.get('/api/cars/')['ETag']
+        self.client.force_authenticate(self.user)
+        self.client.post('/api/reviews/', {'car': self.car.id, 'rating': 4, 'comment': 'Good'})
+        self.assertEqual(self.revalidate('/api/cars/', etag).status_code, 200)
+
+
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('reviewer', password='password123')
+        self.brand = Brand.objects.create(name='Brand', image='cars/related/brand')
+        self.car = make_car(self.brand, name='First')
+        self.other = make_car(self.brand, name='Second')
+
+    def test_repeat_requests_skip_the_database(self):
+        for url in ['/api/cars/?car_type=Sedan&brand=1,2', '/api/cars/featured/', '/api/brands/', '/api/features/']:
+            self.client.get(url)
+            # Only the catalog stamp lookup for the ETag
+            with self.assertNumQueries(1):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_query_string_is_normalized(self):
+        self.client.get('/api/cars/?brand=2,1&car_type=Sedan')
+        with self.assertNumQueries(1):
+            self.client.get('/api/cars/?car_type=Sedan&brand=1,2')
+
+    def test_invalidation_is_scoped_to_the_changed_car(self):
+        self.client.get(f'/api/cars/{self.car.id}/')
+        self.client.get(f'/api/cars/{self.other.id}/')
+        self.other.name = 'Renamed'
+        self.other.save()
+        with self.assertNumQueries(1):
+            self.client.get(f'/api/cars/{self.car.id}/')
+        self.assertEqual(self.client.get(f'/api/cars/{self.other.id}/').data['name'], 'Renamed')
+
+    def test_review_refreshes_ratings(self):
+        self.assertEqual(self.client.get(f'/api/cars/{self.car.id}/').data['review_count'], 0)
+        self.client.force_authenticate(self.user)
+        self.client.post('/api/reviews/', {'car': self.car.id, 'rating': 5, 'comment': 'Great'})
+        self.assertEqual(self.client.get(f'/api/cars/{self.car.id}/').data['review_count'], 1)
+        ratings = {car['id']: car['average_rating'] for car in self.client.get('/api/cars/').data['results']}
+        self.assertEqual(ratings[self.car.id], 5.0)
+
+
+class RatingAggregateTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.car, self.other = make_car(None, name='Car'), make_car(None, name='Other')
+        self.alice = User.objects.create_user('alice', password='password123')
+        self.bob = User.objects.create_user('bob', password='password123')
+
+    def review(self, user, car, rating):
+        self.client.force_authenticate(user)
+        response = self.client.post('/api/reviews/', {'car': car.id, 'rating': rating, 'comment': 'Fine'})
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def aggregates(self, car):
+        car.refresh_from_db()
+        return car.rating_sum, car.review_count, car.average_rating
+
+    def test_create_update_and_delete(self):
+        self.review(self.alice, self.car, 5)
+        review_id = self.review(self.bob, self.car, 2)
+        self.assertEqual(self.aggregates(self.car), (7, 2, 3.5))
+
+        self.client.patch(f'/api/reviews/{review_id}/', {'rating': 4})
+        self.assertEqual(self.aggregates(self.car), (9, 2, 4.5))
+
+        # Moving the review takes its rating to the other car
+        self.client.patch(f'/api/reviews/{review_id}/', {'car': self.other.id})
+        self.assertEqual(self.aggregates(self.car), (5, 1, 5.0))
+        self.assertEqual(self.aggregates(self.other), (4, 1, 4.0))
+
+        self.assertEqual(self.client.delete(f'/api/reviews/{review_id}/').status_code, 204)
+        self.assertEqual(self.aggregates(self.other), (0, 0, 0.0))
+        self.assertEqual(self.aggregates(self.car), (5, 1, 5.0))
+
+    def test_rebuild_ratings_repairs_drift(self):
+        self.review(self.alice, self.car, 4)
+        self.review(self.bob, self.car, 3)
+        Car.objects.filter(pk__in=[self.car.pk, self.other.pk]).update(rating_sum=40, review_count=1, average_rating=40)
+
+        call_command('rebuild_ratings', stdout=io.StringIO())
+        self.assertEqual(self.aggregates(self.car), (7, 2, 3.5))
+        self.assertEqual(self.aggregates(self.other), (0, 0, 0.0))
+
+
+class StoredImageURLTests(APITestCase):
+    def test_urls_are_built_at_save_time(self):
+        brand = Brand.objects.create(name='Brand', image='cars/related/brand')
+        car = make_car(brand, images=1, image='cars/hero')
+        self.assertEqual(set(car.image_urls), {'original', 'thumbnail', 'card', 'hero'})
+
+        with mock.patch.object(cloudinary.CloudinaryResource, 'build_url', side_effect=AssertionError):
+            data = self.client.get(f'/api/cars/{car.id}/').data
+        self.assertEqual(data['image'], car.image_urls['original'])
+        self.assertEqual(data['srcset']['480w'], car.image_urls['card'])
+        self.assertIn('c_fill', data['brand']['srcset']['160w'])
+        self.assertEqual(len(data['images'][0]['srcset']), 3)
+
+
+class FleetAvailabilityTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('renter', password='password123')
+        self.booked = make_car(None, name='Booked', car_type='SUV')
+        self.free = make_car(None, name='Free', car_type='SUV')
+        self.cancelled = make_car(None, name='Cancelled booking', car_type='Sedan')
+        self.book(self.booked, date(2026, 6, 3), date(2026, 6, 6))
+        self.book(self.cancelled, date(2026, 6, 1), date(2026, 6, 10), status='cancelled')
+
+    def book(self, car, pickup, return_date, status='confirmed'):
+        return Booking.objects.create(
+            user=self.user, car=car, pickup_date=pickup, return_date=return_date,
+            total_days=(return_date - pickup).days, total_cost=100, status=status,
+        )
+
+    def names(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return sorted(car['name'] for car in response.data['results'])
+
+    def test_list_filter_excludes_overlapping_bookings(self):
+        self.assertEqual(
+            self.names('/api/cars/?available_from=2026-06-05&available_to=2026-06-08'),
+            ['Cancelled booking', 'Free'],
+        )
+        # Returned on the 6th, so free to pick up that day
+        self.assertEqual(len(self.names('/api/cars/?available_from=2026-06-06&available_to=2026-06-08')), 3)
+
+    def test_search_endpoint_combines_with_filters(self):
+        with self.assertNumQueries(2):  # count + page
+            names = self.names('/api/cars/available/?available_from=2026-06-01&available_to=2026-06-04&car_type=SUV')
+        self.assertEqual(names, ['Free'])
+
+    def test_new_bookings_are_not_served_from_cache(self):
+        url = '/api/cars/available/?available_from=2026-07-01&available_to=2026-07-03'
+        self.assertEqual(len(self.names(url)), 3)
+        self.book(self.free, date(2026, 7, 2), date(2026, 7, 4))
+        self.assertEqual(len(self.names(url)), 2)
+
+    def test_featured_drops_newly_booked_cars(self):
+        featured = make_car(None, name='Featured', featured=True)
+        url = '/api/cars/featured/?available_from=2026-07-01&available_to=2026-07-03'
+        first = self.client.get(url)
+        self.assertEqual([car['name'] for car in first.data], ['Featured'])
+
+        self.book(featured, date(2026, 7, 2), date(2026, 7, 4))
+        # Neither a 304 from the catalog ETag nor the cached body
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first.get('ETag', '"none"'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [])
+
+    def test_invalid_ranges(self):
+        self.assertEqual(self.client.get('/api/cars/available/').status_code, 400)
+        self.assertEqual(self.client.get('/api/cars/?available_from=2026-06-05').status_code, 400)
+        self.assertEqual(self.client.get('/api/cars/?available_from=2026-06-05&available_to=2026-06-01').status_code, 400)
+
+
+class AvailabilityCalendarTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('renter', password='password123')
+        self.car = make_car(None)
+        self.book(date(2026, 5, 30), date(2026, 6, 3))
+        self.book(date(2026, 6, 3), date(2026, 6, 5))  # back to back: merged
+        self.book(date(2026, 6, 28), date(2026, 7, 2))  # across the month end
+        self.book(date(2026, 6, 10), date(2026, 6, 12), status='cancelled')
+
+    def book(self, pickup, return_date, status='confirmed', car=None):
+        return Booking.objects.create(
+            user=self.user, car=car or self.car, pickup_date=pickup, return_date=return_date,
+            total_days=(return_date - pickup).days, total_cost=100, status=status,
+        )
+
+    def booked(self, query):
+        response = self.client.get(f'/api/cars/{self.car.id}/calendar/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return [(interval['start'], interval['end']) for interval in response.data['booked']]
+
+    def test_intervals_are_merged_across_months(self):
+        self.assertEqual(self.booked('month=2026-06&months=2'), [
+            (date(2026, 6, 1), date(2026, 6, 5)),
+            (date(2026, 6, 28), date(2026, 7, 2)),
+        ])
+        # Served from the cached month, clipped to the window
+        with self.assertNumQueries(1):  # the car lookup
+            self.assertEqual(self.booked('month=2026-06')[-1], (date(2026, 6, 28), date(2026, 7, 1)))
+
+    def test_missing_months_cost_one_query(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(len(self.booked('month=2026-05&months=3')), 2)
+
+    def test_booking_write_invalidates_only_its_months(self):
+        self.booked('month=2026-05&months=4')
+        booking = self.book(date(2026, 8, 10), date(2026, 8, 12))
+        with self.assertNumQueries(2):
+            self.assertEqual(self.booked('month=2026-08'), [(date(2026, 8, 10), date(2026, 8, 12))])
+        with self.assertNumQueries(1):
+            self.booked('month=2026-05&months=3')
+
+        booking.status = 'cancelled'
+        booking.save()
+        self.assertEqual(self.booked('month=2026-08'), [])
+
+        booking.payment_status = 'succeeded'
+        booking.save()
+        with self.assertNumQueries(1):
+            self.booked('month=2026-08')
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get(f'/api/cars/{self.car.id}/calendar/?month=June').status_code, 400)
+        self.assertEqual(self.client.get(f'/api/cars/{self.car.id}/calendar/?months=13').status_code, 400)
+        self.assertEqual(self.client.get('/api/cars/999/calendar/').status_code, 404)
+
+
+class BookingConflictTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('renter', password='password123')
+        self.client.force_authenticate(self.user)
+        self.car = make_car(None)
+        self.existing = Booking.objects.create(
+            user=self.user, car=self.car, pickup_date=date(2026, 6, 3), return_date=date(2026, 6, 6),
+            total_days=3, total_cost=300, status='confirmed',
+        )
+
+    def create(self, pickup, return_date):
+        return self.client.post('/api/bookings/', {
+            'car_id': self.car.id, 'pickup_date': pickup, 'return_date': return_date,
+            'total_days': 1, 'total_cost': 100,
+        })
+
+    def test_overlapping_booking_is_rejected(self):
+        response = self.create('2026-06-05', '2026-06-08')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['conflicting_booking']['pickup_date'], '2026-06-03')
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_back_to_back_and_cancelled_bookings_are_allowed(self):
+        self.assertEqual(self.create('2026-06-06', '2026-06-08').status_code, 201)
+        self.existing.status = 'cancelled'
+        self.existing.save()
+        self.assertEqual(self.create('2026-06-01', '2026-06-04').status_code, 201)
+
+    def test_updates_are_checked_against_other_bookings(self):
+        other = self.create('2026-06-10', '2026-06-12').data['id']
+        response = self.client.patch(f'/api/bookings/{other}/', {'pickup_date': '2026-06-05'})
+        self.assertEqual(response.status_code, 409)
+        # Moving a booking within its own dates is fine
+        response = self.client.patch(f'/api/bookings/{self.existing.id}/', {'return_date': '2026-06-05'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.create('2026-06-10', '2026-06-10').status_code, 400)
+        response = self.client.post('/api/bookings/', {
+            'car_id': 999, 'pickup_date': '2026-06-10', 'return_date': '2026-06-12',
+            'total_days': 2, 'total_cost': 200,
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(AVAILABILITY_INDEX=True)
+class AvailabilityIndexTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('renter', password='password123')
+        self.car = make_car(None, name='Booked')
+        self.other = make_car(None, name='Free')
+        self.booking = Booking.objects.create(
+            user=self.user, car=self.car, pickup_date=date(2026, 12, 30), return_date=date(2027, 1, 3),
+            total_days=4, total_cost=400, status='confirmed',
+        )
+
+    def names(self, pickup, return_date):
+        response = self.client.get(f'/api/cars/?available_from={pickup}&available_to={return_date}')
+        return [car['name'] for car in response.data['results']]
+
+    def test_day_masks(self):
+        self.assertEqual(availability_index.day_mask(2026, date(2026, 1, 2), date(2026, 1, 4)), 0b110)
+        self.assertEqual(availability_index.day_mask(2026, date(2025, 12, 30), date(2026, 1, 2)), 0b1)
+        self.assertEqual(availability_index.day_mask(2026, date(2027, 1, 1), date(2027, 1, 2)), 0)
+
+    def test_searches_are_answered_from_the_bitmaps(self):
+        self.assertEqual(self.names('2027-01-02', '2027-01-05'), ['Free'])
+        self.assertEqual(len(self.names('2027-01-03', '2027-01-05')), 2)
+        response = self.client.get(f'/api/cars/{self.car.id}/calendar/?month=2026-12&months=2')
+        self.assertEqual(
+            [(interval['start'], interval['end']) for interval in response.data['booked']],
+            [(date(2026, 12, 30), date(2027, 1, 3))],
+        )
+
+    def test_status_changes_update_the_index(self):
+        self.assertEqual(self.names('2026-12-31', '2027-01-01'), ['Free'])
+        admin = User.objects.create_superuser('admin', password='password123')
+        self.client.force_authenticate(admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/admin/bookings/{self.booking.id}/status/', {'status': 'cancelled'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(availability_index.booked_car_ids([self.car.id], date(2026, 12, 1), date(2027, 2, 1)), set())
+        with self.assertNumQueries(3):  # car ids, count, page - no bookings query
+            self.assertEqual(len(self.names('2026-12-31', '2027-01-01')), 2)
+
+    def test_check_availability_with_a_stale_index(self):
+        dates = {'pickup_date': '2026-12-31', 'return_date': '2027-01-02'}
+        url = f'/api/cars/{self.car.id}/check_availability/'
+        response = self.client.post(url, dates)
+        self.assertEqual(response.data['conflicting_booking']['pickup_date'], date(2026, 12, 30))
+        # update() sends no signals, so the cached bitmap still shows the booking
+        Booking.objects.filter(pk=self.booking.pk).update(status='cancelled')
+        response = self.client.post(url, dates)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['available'])
+
+
+class AdminBookingListTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser('admin', password='password123')
+        self.client.force_authenticate(self.admin)
+        self.user = User.objects.create_user('renter', password='password123')
+        self.cars = [make_car(None, features=[Feature.objects.create(name=f'Feature {i}')], images=2, name=f'Car {i}') for i in range(2)]
+        self.bookings = self.book(6)
+
+    def book(self, count):
+        return [
+            Booking.objects.create(
+                user=self.user, car=self.cars[i % 2], pickup_date=date(2026, 6, 1) + timedelta(days=i * 3),
+                return_date=date(2026, 6, 3) + timedelta(days=i * 3), total_days=2, total_cost=200,
+                status='confirmed' if i % 3 == 0 else 'pending',
+            )
+            for i in range(count)
+        ]
+
+    def test_compact_rows(self):
+        response = self.client.get('/api/admin/bookings/', {'page_size': 2})
+        self.assertEqual(response.data['count'], 6)
+        self.assertEqual(len(response.data['results']), 2)
+        row = response.data['results'][0]
+        self.assertEqual(row['id'], self.bookings[-1].id)
+        self.assertEqual(row['car'], {'id': self.cars[1].id, 'name': 'Car 1'})
+        self.assertEqual(row['user_username'], 'renter')
+
+    def test_query_count_is_constant_per_page(self):
+        with self.assertNumQueries(2):
+            self.client.get('/api/admin/bookings/')
+        self.book(12)
+        with self.assertNumQueries(2):
+            self.assertEqual(len(self.client.get('/api/admin/bookings/').data['results']), 10)
+        # Cursor pages skip the COUNT
+        with self.assertNumQueries(1):
+            self.client.get('/api/admin/bookings/', {'pagination': 'cursor'})
+
+    def test_filters(self):
+        def ids(**params):
+            return [row['id'] for row in self.client.get('/api/admin/bookings/', params).data['results']]
+
+        self.assertEqual(ids(status='confirmed'), [self.bookings[3].id, self.bookings[0].id])
+        self.assertEqual(ids(car_id=self.cars[0].id, pickup_from='2026-06-07'), [self.bookings[4].id, self.bookings[2].id])
+        self.assertEqual(ids(pickup_to='2026-06-04'), [self.bookings[1].id, self.bookings[0].id])
+        today = timezone.localdate()
+        self.assertEqual(len(ids(created_from=today.isoformat(), created_to=today.isoformat())), 6)
+        self.assertEqual(ids(created_from=(today + timedelta(days=1)).isoformat()), [])
+        self.assertEqual(self.client.get('/api/admin/bookings/', {'user_id': 'me'}).status_code, 400)
+
+
+class AdminExportTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser('admin', password='password123')
+        self.client.force_authenticate(self.admin)
+        self.user = User.objects.create_user('renter', email='renter@example.com', password='password123')
+        self.car = make_car(None, name='Corolla')
+        self.bookings = [
+            Booking.objects.create(
+                user=self.user, car=self.car, pickup_date=date(2026, 6, 1 + i * 3), return_date=date(2026, 6, 3 + i * 3),
+                total_days=2, total_cost=100, payment_status='succeeded' if i else 'pending',
+            )
+            for i in range(3)
+        ]
+
+    def export(self, kind, **params):
+        response = self.client.get(f'/api/admin/export/{kind}/', params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_bookings_csv_selects_only_requested_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response, body = self.export('bookings', fields='id,car,total_cost')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('attachment; filename="bookings-', response['Content-Disposition'])
+        self.assertEqual(body.splitlines(), ['id,car,total_cost'] + [f'{booking.id},Corolla,100.00' for booking in self.bookings])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('payment_status', queries[0]['sql'])
+
+    def test_users_ndjson_with_aggregates(self):
+        response, body = self.export('users', output='ndjson', fields='username,booking_count,total_spent')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual((rows[0]['username'], rows[0]['booking_count'], float(rows[0]['total_spent'])), ('renter', 3, 200))
+
+    def test_date_range_and_validation(self):
+        today = timezone.localdate()
+        _, body = self.export('reviews', start=today.isoformat())
+        self.assertEqual(body.splitlines(), ['id,user_id,username,car_id,car,rating,comment,created_at'])
+        _, body = self.export('bookings', fields='id', end=(today - timedelta(days=1)).isoformat())
+        self.assertEqual(body.splitlines(), ['id'])
+        _, body = self.export('revenue', output='ndjson', start=today.isoformat(), end=today.isoformat())
+        self.assertEqual(json.loads(body)['revenue'], '200.00')
+
+        self.assertEqual(self.client.get('/api/admin/export/bookings/', {'fields': 'id,password'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/admin/export/bookings/', {'output': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/admin/export/payments/').status_code, 404)
+
+
+class FleetCalendarTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser('admin', password='password123')
+        self.client.force_authenticate(self.admin)
+        self.booked = make_car(None, name='Booked')
+        self.free = make_car(None, name='Free')
+        self.workshop = make_car(None, name='Workshop', is_available=False)
+        for pickup, return_date, status in (
+            (date(2026, 5, 30), date(2026, 6, 3), 'confirmed'),
+            (date(2026, 6, 5), date(2026, 6, 7), 'pending'),
+            (date(2026, 6, 6), date(2026, 6, 9), 'cancelled'),
+        ):
+            Booking.objects.create(
+                user=self.admin, car=self.booked, pickup_date=pickup, return_date=return_date,
+                total_days=(return_date - pickup).days, total_cost=100, status=status,
+            )
+
+    def get(self, query):
+        response = self.client.get(f'/api/admin/fleet-calendar/?start=2026-06-01&{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_run_length_rows(self):
+        with self.assertNumQueries(2):
+            data = self.get('weeks=1')
+        self.assertEqual(data['car_names'], ['Booked', 'Free', 'Workshop'])
+        self.assertEqual(data['rows'], [
+            [2, 2, 0, 2, 1, 2, 0, 1],
+            [0, 7],
+            [3, 7],
+        ])
+
+    def test_packed_rows(self):
+        data = self.get('weeks=1&encoding=packed')
+        self.assertEqual(data['row_bytes'], 2)
+        packed = base64.b64decode(data['rows'])
+        # free/booked/... two bits per day, first day in the top bits
+        self.assertEqual(packed[:2], bytes([0b10100000, 0b01010000]))
+        self.assertEqual(packed[4:], bytes([0xff, 0xfc]))
+
+    def test_empty_fleet(self):
+        Car.objects.all().delete()
+        data = self.get('weeks=1&encoding=packed')
+        self.assertEqual((data['row_bytes'], data['rows']), (2, ''))
+        self.assertEqual(self.get('weeks=1')['rows'], [])
+
+    def test_requires_admin_and_valid_parameters(self):
+        self.assertEqual(self.client.get('/api/admin/fleet-calendar/?weeks=14').status_code, 400)
+        self.assertEqual(self.client.get('/api/admin/fleet-calendar/?encoding=json').status_code, 400)
+        self.client.force_authenticate(User.objects.create_user('renter', password='password123'))
+        self.assertEqual(self.client.get('/api/admin/fleet-calendar/').status_code, 403)
+
+
+class EmailOutboxTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('renter', email='renter@example.com', password='password123')
+        self.client.force_authenticate(self.user)
+        self.car = make_car(None)
+
+    def book(self):
+        return self.client.post('/api/bookings/', {
+            'car_id': self.car.id, 'pickup_date': '2026-06-01', 'return_date': '2026-06-03',
+            'total_days': 2, 'total_cost': 200,
+        })
+
+    def test_booking_queues_email_instead_of_sending(self):
+        self.assertEqual(self.book().status_code, 201)
+        self.assertEqual(len(mail.outbox), 0)
+        queued = EmailOutbox.objects.get()
+        self.assertEqual((queued.recipient, queued.status), ('renter@example.com', 'pending'))
+
+        self.assertEqual(deliver_outbox(), {'sent': 1, 'retrying': 0, 'failed': 0})
+        self.assertEqual(mail.outbox[0].subject, 'Booking Confirmation - Test Car')
+        self.assertEqual(EmailOutbox.objects.get().status, 'sent')
+        # Nothing left to claim
+        self.assertEqual(deliver_outbox(), {'sent': 0, 'retrying': 0, 'failed': 0})
+
+    def test_rejected_booking_queues_nothing(self):
+        self.book()
+        self.assertEqual(self.book().status_code, 409)
+        self.assertEqual(EmailOutbox.objects.count(), 1)
+
+    @override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+    def test_failures_back_off_then_give_up(self):
+        self.book()
+        with mock.patch('django.core.mail.EmailMessage.send', side_effect=OSError('connection refused')):
+            self.assertEqual(deliver_outbox(), {'sent': 0, 'retrying': 1, 'failed': 0})
+            message = EmailOutbox.objects.get()
+            self.assertEqual((message.status, message.attempts), ('pending', 1))
+            self.assertIn('connection refused', message.last_error)
+
+            # Not due again until the backoff has passed
+            self.assertEqual(deliver_outbox()['retrying'], 0)
+            EmailOutbox.objects.update(next_attempt_at=message.created_at)
+            self.assertEqual(deliver_outbox(), {'sent': 0, 'retrying': 0, 'failed': 1})
+        self.assertEqual(EmailOutbox.objects.get().status, 'failed')
+
+
+class NewsletterCampaignTests(TestCase):
+    def setUp(self):
+        self.subscribers = [Newsletter.objects.create(email=f'reader{i}@example.com') for i in range(7)]
+        Newsletter.objects.create(email='gone@example.com', is_active=False)
+        self.campaign = NewsletterCampaign.objects.create(subject='Summer deals', body='Half price SUVs')
+
+    def test_sends_once_to_each_active_subscriber(self):
+        # claim, reload checkpoint, 3 chunks + an empty one, 3 checkpoints, finish, reload
+        with self.assertNumQueries(11):
+            campaign = send_campaign(self.campaign, connections=2, chunk_size=3)
+        self.assertEqual((campaign.status, campaign.sent_count, campaign.failed_count), ('sent', 7, 0))
+        self.assertEqual(campaign.last_subscriber_id, self.subscribers[-1].id)
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            sorted(subscriber.email for subscriber in self.subscribers),
+        )
+
+    def test_resumes_after_checkpoint(self):
+        NewsletterCampaign.objects.filter(pk=self.campaign.pk).update(
+            status='sending', last_subscriber_id=self.subscribers[4].id, sent_count=5,
+        )
+        self.campaign.refresh_from_db()
+        campaign = send_campaign(self.campaign, chunk_size=3)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(campaign.sent_count, 7)
+
+    def test_one_run_at_a_time(self):
+        claim_campaign(self.campaign)
+        with self.assertRaises(CampaignInProgress):
+            send_campaign(self.campaign)
+        self.assertEqual(len(mail.outbox), 0)
+
+        # A lapsed lease can be taken over; the old run stops at its next checkpoint
+        NewsletterCampaign.objects.filter(pk=self.campaign.pk).update(claimed_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(send_campaign(self.campaign).sent_count, 7)
+
+    def test_run_that_lost_its_lease_stops(self):
+        def take_over(last_id, sent, failed):
+            NewsletterCampaign.objects.filter(pk=self.campaign.pk).update(claimed_until=timezone.now())
+
+        with self.assertRaises(CampaignInProgress):
+            send_campaign(self.campaign, chunk_size=3, progress=take_over)
+        self.assertEqual(len(mail.outbox), 6)
+        self.assertEqual(NewsletterCampaign.objects.get(pk=self.campaign.pk).status, 'sending')
+
+    def test_failed_sends_are_counted(self):
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError):
+            campaign = send_campaign(self.campaign)
+        self.assertEqual((campaign.sent_count, campaign.failed_count), (0, 7))
+
+
+WEBHOOK_SECRET = 'whsec_test'
+
+
+def signed_event(event_type, session, event_id='evt_1'):
+    """Webhook body and Stripe-Signature header, signed the way Stripe does"""
+    payload = json.dumps({
+        'id': event_id, 'object': 'event', 'type': event_type,
+        'data': {'object': {'object': 'checkout.session', **session}},
+    })
+    timestamp = int(time.time())
+    signature = hmac.new(WEBHOOK_SECRET.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+    return payload, f't={timestamp},v1={signature}'
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET)
+class StripeWebhookTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('renter', password='password123')
+        self.booking = Booking.objects.create(
+            user=self.user, car=make_car(None), pickup_date=date(2026, 6, 1), return_date=date(2026, 6, 3),
+            total_days=2, total_cost=200, payment_status='processing', stripe_session_id='cs_1',
+        )
+        self.session = {
+            'id': 'cs_1', 'payment_status': 'paid', 'payment_intent': 'pi_1',
+            'metadata': {'booking_id': str(self.booking.id)},
+        }
+
+    def deliver(self, event_type, session=None, event_id='evt_1', signature=None):
+        payload, header = signed_event(event_type, session or self.session, event_id)
+        return self.client.generic(
+            'POST', '/api/payments/webhook/', payload,
+            content_type='application/json', HTTP_STRIPE_SIGNATURE=signature or header,
+        )
+
+    def test_completed_checkout_confirms_the_booking_once(self):
+        self.assertEqual(self.deliver('checkout.session.completed').status_code, 200)
+        self.booking.refresh_from_db()
+        self.assertEqual(
+            (self.booking.status, self.booking.payment_status, self.booking.payment_intent_id),
+            ('confirmed', 'succeeded', 'pi_1'),
+        )
+
+        # Redelivery is acknowledged without being handled again
+        with mock.patch('cars.payments.mark_booking_paid') as mark_booking_paid:
+            self.assertEqual(self.deliver('checkout.session.completed').status_code, 200)
+        mark_booking_paid.assert_not_called()
+        self.assertEqual(StripeEvent.objects.get().booking, self.booking)
+
+    def test_unsigned_events_are_rejected(self):
+        self.assertEqual(self.deliver('checkout.session.completed', signature='t=1,v1=forged').status_code, 400)
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.payment_status, 'processing')
+
+    def test_unpaid_and_expired_sessions(self):
+        self.deliver('checkout.session.completed', {**self.session, 'payment_status': 'unpaid'})
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.payment_status, 'processing')
+
+        self.deliver('checkout.session.expired', event_id='evt_2')
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.payment_status, 'pending')
+
+    @mock.patch('cars.stripe_client.retrieve_checkout_session', side_effect=AssertionError('no Stripe calls'))
+    def test_status_and_verify_read_local_state(self, retrieve):
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/payments/status/?session_id=cs_1')
+        self.assertEqual(response.data['booking']['payment_status'], 'processing')
+
+        self.deliver('checkout.session.completed')
+        response = self.client.get(f'/api/payments/status/?booking_id={self.booking.id}')
+        self.assertEqual(response.data['booking']['payment_status'], 'succeeded')
+        response = self.client.post('/api/payments/verify/', {'session_id': 'cs_1'})
+        self.assertEqual(response.data['booking']['status'], 'confirmed')
+
+        self.client.force_authenticate(User.objects.create_user('other', password='password123'))
+        self.assertEqual(self.client.get('/api/payments/status/?session_id=cs_1').status_code, 404)
+
+
+class FakeStripe(ThreadingHTTPServer):
+    """Just enough of the Stripe checkout sessions API to run offline"""
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeStripeHandler)
+        self.sessions, self.responses, self.requests = {}, {}, []
+        self.failures, self.delay = 0, 0
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_port}'
+
+    def handle_error(self, request, client_address):
+        # Clients that timed out hang up before the reply
+        pass
+
+
+class FakeStripeHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        server = self.server
+        key = self.headers.get('Idempotency-Key')
+        server.requests.append(('POST', self.path, key))
+        time.sleep(server.delay)
+        if server.failures:
+            server.failures -= 1
+            return self.reply(500, {'error': {'message': 'Try again'}}, {'Stripe-Should-Retry': 'true'})
+        if key not in server.responses:
+            params = parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode())
+            session_id = f'cs_fake_{len(server.sessions) + 1}'
+            server.sessions[session_id] = {
+                'id': session_id, 'object': 'checkout.session', 'payment_status': 'unpaid',
+                'url': f'https://checkout.example/{session_id}',
+                'metadata': {'booking_id': params['metadata[booking_id]'][0]},
+            }
+            server.responses[key] = server.sessions[session_id]
+        self.reply(200, server.responses[key])
+
+    def do_GET(self):
+        self.server.requests.append(('GET', self.path, None))
+        path, _, query = self.path.partition('?')
+        if path == '/v1/checkout/sessions':
+            return self.list_sessions(parse_qs(query))
+        session = self.server.sessions.get(path.rsplit('/', 1)[-1])
+        self.reply(200 if session else 404, session or {'error': {'message': 'No such session'}})
+
+    def list_sessions(self, params):
+        # Newest first, like Stripe
+        sessions = sorted(self.server.sessions.values(), key=lambda session: session.get('created', 0), reverse=True)
+        sessions = [session for session in sessions if session.get('created', 0) >= int(params['created[gte]'][0])]
+        if 'starting_after' in params:
+            ids = [session['id'] for session in sessions]
+            sessions = sessions[ids.index(params['starting_after'][0]) + 1:]
+        limit = int(params['limit'][0])
+        self.reply(200, {
+            'object': 'list', 'url': '/v1/checkout/sessions',
+            'data': sessions[:limit], 'has_more': len(sessions) > limit,
+        })
+
+    def reply(self, status, body, headers=()):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in dict(headers).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeStripeTestCase(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stripe = FakeStripe()
+        threading.Thread(target=cls.stripe.serve_forever, daemon=True).start()
+        cls.settings = override_settings(
+            STRIPE_API_BASE=cls.stripe.url, STRIPE_SECRET_KEY='sk_test_fake',
+            STRIPE_READ_TIMEOUT=0.5, STRIPE_MAX_RETRIES=2,
+        )
+        cls.settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings.disable()
+        cls.stripe.shutdown()
+        cls.stripe.server_close()
+        stripe_client.get_client.cache_clear()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        stripe_client.get_client.cache_clear()
+        for recorded in (self.stripe.sessions, self.stripe.responses, self.stripe.requests):
+            recorded.clear()
+        self.stripe.failures, self.stripe.delay = 0, 0
+        # No backoff between retries
+        patcher = mock.patch('stripe._http_client.HTTPClient._sleep_time_seconds', return_value=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class StripeClientTests(FakeStripeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('renter', password='password123')
+        self.client.force_authenticate(self.user)
+        self.booking = Booking.objects.create(
+            user=self.user, car=make_car(None), pickup_date=date(2026, 6, 1), return_date=date(2026, 6, 3),
+            total_days=2, total_cost=200,
+        )
+
+    def checkout(self):
+        return self.client.post('/api/payments/create-checkout-session/', {'booking_id': self.booking.id})
+
+    def test_checkout_goes_through_the_client(self):
+        response = self.checkout()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['url'], 'https://checkout.example/cs_fake_1')
+        self.booking.refresh_from_db()
+        self.assertEqual((self.booking.stripe_session_id, self.booking.payment_status), ('cs_fake_1', 'processing'))
+        self.assertGreaterEqual(stripe_client.stripe_latency()['checkout.sessions.create']['count'], 1)
+
+    def test_retries_reuse_the_idempotency_key(self):
+        self.stripe.failures = 2
+        self.assertEqual(self.checkout().status_code, 200)
+        keys = [key for method, _, key in self.stripe.requests]
+        self.assertEqual(len(keys), 3)
+        self.assertEqual(len(set(keys)), 1)
+        self.assertEqual(len(self.stripe.sessions), 1)
+
+    def test_timeouts_are_bounded(self):
+        self.stripe.delay = 1
+        began = time.perf_counter()
+        response = self.checkout()
+        self.assertEqual(response.status_code, 503)
+        # Three attempts at a 0.5 s read timeout, not Stripe's default 80 s
+        self.assertLess(time.perf_counter() - began, 3)
+
+    def test_async_variants(self):
+        async def create_and_retrieve():
+            session = await stripe_client.create_checkout_session_async({
+                'mode': 'payment', 'metadata': {'booking_id': self.booking.id},
+            }, 'async-key')
+            return await stripe_client.retrieve_checkout_session_async(session.id)
+        self.assertEqual(asyncio.run(create_and_retrieve()).id, 'cs_fake_1')
+
+
+class ReconcilePaymentsTests(FakeStripeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('renter', password='password123')
+        car = make_car(None)
+        self.bookings = []
+        created = int(time.time())
+        for i, (payment_status, session) in enumerate([
+            ('processing', {'payment_status': 'paid', 'payment_intent': 'pi_0'}),
+            ('processing', {'payment_status': 'unpaid', 'status': 'expired'}),
+            ('processing', {'payment_status': 'unpaid', 'status': 'open'}),
+            ('succeeded', {'payment_status': 'paid'}),
+        ]):
+            booking = Booking.objects.create(
+                user=self.user, car=car, pickup_date=date(2026, 6, 1 + i * 3), return_date=date(2026, 6, 3 + i * 3),
+                total_days=2, total_cost=200, payment_status=payment_status, stripe_session_id=f'cs_{i}',
+            )
+            self.bookings.append(booking)
+            self.stripe.sessions[f'cs_{i}'] = {'id': f'cs_{i}', 'object': 'checkout.session', 'created': created - i, **session}
+        # Someone else's session in the same window
+        self.stripe.sessions['cs_other'] = {'id': 'cs_other', 'object': 'checkout.session', 'created': created - 10}
+
+    def states(self):
+        return [
+            Booking.objects.values_list('status', 'payment_status').get(pk=booking.pk)
+            for booking in self.bookings
+        ]
+
+    def test_settles_from_listed_pages(self):
+        list_sessions = stripe_client.list_checkout_sessions
+        with mock.patch.object(stripe_client, 'list_checkout_sessions', lambda created_gte: list_sessions(created_gte, page_size=2)):
+            summary = reconcile_payments()
+        self.assertEqual(summary, {'checked': 3, 'sessions': 3, 'paid': 1, 'expired': 1})
+        self.assertEqual(self.states(), [
+            ('confirmed', 'succeeded'),
+            ('pending', 'pending'),
+            ('pending', 'processing'),
+            ('pending', 'succeeded'),
+        ])
+        # Two list pages, no per-session retrieves
+        self.assertEqual([method for method, _, _ in self.stripe.requests], ['GET', 'GET'])
+        # Both paid bookings are in the revenue rollups
+        self.assertEqual(RevenueRollup.objects.get(period='month').revenue, 400)
+
+    def list_then(self, change):
+        """Patch the session listing to run change() once Stripe has been read"""
+        list_sessions = stripe_client.list_checkout_sessions
+
+        def listing(created_gte):
+            sessions = list(list_sessions(created_gte))
+            change()
+            return iter(sessions)
+        return mock.patch.object(stripe_client, 'list_checkout_sessions', listing)
+
+    def test_booking_settled_during_listing_is_left_alone(self):
+        def webhook():
+            booking = Booking.objects.get(pk=self.bookings[0].pk)
+            booking.payment_status, booking.status, booking.payment_intent_id = 'succeeded', 'confirmed', 'pi_hook'
+            booking.save()
+
+        with self.list_then(webhook):
+            summary = reconcile_payments()
+        self.assertEqual((summary['paid'], summary['expired']), (0, 1))
+        self.assertEqual(Booking.objects.get(pk=self.bookings[0].pk).payment_intent_id, 'pi_hook')
+        # Counted once, by the webhook's save, alongside the already paid booking
+        self.assertEqual(RevenueRollup.objects.get(period='month').revenue, 400)
+
+    def test_booking_cancelled_during_listing_stays_cancelled(self):
+        with self.list_then(lambda: Booking.objects.filter(pk=self.bookings[0].pk).update(status='cancelled')):
+            reconcile_payments()
+        self.assertEqual(self.states()[0], ('cancelled', 'succeeded'))
+
+    def test_dry_run_saves_nothing(self):
+        self.assertEqual(reconcile_payments(dry_run=True)['paid'], 1)
+        self.assertEqual(self.states()[0], ('pending', 'processing'))
+
+
+class AdminStatsTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser('admin', password='password123')
+        self.client.force_authenticate(self.admin)
+        self.user = User.objects.create_user('renter', password='password123')
+        self.cars = [make_car(None, name=f'Car {i}') for i in range(3)]
+        for i, (status, payment_status) in enumerate([
+            ('confirmed', 'succeeded'), ('confirmed', 'succeeded'), ('pending', 'pending'), ('cancelled', 'failed'),
+        ]):
+            Booking.objects.create(
+                user=self.user, car=self.cars[i % 2], pickup_date=date(2026, 6, 1 + i * 3),
+                return_date=date(2026, 6, 3 + i * 3), total_days=2, total_cost=100 * (i + 1),
+                status=status, payment_status=payment_status,
+            )
+        Review.objects.create(user=self.user, car=self.cars[0], rating=5, comment='Great')
+
+    def test_stats_in_a_fixed_number_of_queries(self):
+        with self.assertNumQueries(5):
+            data = self.client.get('/api/admin/stats/').data
+        self.assertEqual(data['overview']['total_bookings'], 4)
+        self.assertEqual(data['overview']['total_revenue'], 300)
+        self.assertEqual(data['status_breakdown'], {'pending': 1, 'confirmed': 2, 'cancelled': 1, 'completed': 0})
+        self.assertEqual(
+            [(car['name'], car['bookings'], car['revenue']) for car in data['popular_cars'][:2]],
+            [('Car 0', 2, 100), ('Car 1', 2, 200)],
+        )
+        self.assertEqual(data['recent_reviews'][0]['comment'], 'Great')
+
+    def test_snapshot_is_invalidated_by_booking_writes(self):
+        self.client.get('/api/admin/stats/')
+        with self.assertNumQueries(0):
+            self.client.get('/api/admin/stats/')
+
+        booking = Booking.objects.get(status='pending')
+        booking.payment_status, booking.status = 'succeeded', 'confirmed'
+        booking.save()
+        data = self.client.get('/api/admin/stats/').data
+        self.assertEqual(data['overview']['total_revenue'], 600)
+
+
+class RevenueRollupTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser('admin', password='password123')
+        self.client.force_authenticate(self.admin)
+        self.user = User.objects.create_user('renter', password='password123')
+        toyota, honda = Brand.objects.create(name='Toyota'), Brand.objects.create(name='Honda')
+        self.cars = [make_car(toyota, name='Corolla'), make_car(toyota, name='Camry'), make_car(honda, name='Civic')]
+        self.this_month = timezone.localdate().replace(day=1)
+
+    def book(self, car, cost, payment_status='succeeded', **kwargs):
+        return Booking.objects.create(
+            user=self.user, car=car, pickup_date=date(2026, 6, 1), return_date=date(2026, 6, 3),
+            total_days=2, total_cost=cost, payment_status=payment_status, **kwargs,
+        )
+
+    def rollups(self):
+        return sorted(RevenueRollup.objects.values_list('period', 'car_id', 'revenue', 'bookings'))
+
+    def test_rollups_follow_payment_status(self):
+        booking = self.book(self.cars[0], 100, payment_status='pending')
+        self.assertFalse(RevenueRollup.objects.exists())
+
+        booking.payment_status = 'succeeded'
+        booking.save()
+        self.assertEqual(RevenueRollup.objects.get(period='day').revenue, 100)
+        self.assertEqual(RevenueRollup.objects.get(period='month').bookings, 1)
+
+        booking.total_cost = 150
+        booking.save()
+        self.assertEqual(RevenueRollup.objects.get(period='month').revenue, 150)
+
+        booking.delete()
+        self.assertEqual(self.rollups(), [('day', self.cars[0].id, 0, 0), ('month', self.cars[0].id, 0, 0)])
+
+    def test_chart_reads_rollups(self):
+        self.book(self.cars[0], 100)
+        self.book(self.cars[2], 250)
+        self.book(self.cars[1], 999, payment_status='failed')
+        with self.assertNumQueries(1):
+            data = self.client.get('/api/admin/revenue/').data
+        self.assertEqual(len(data), 12)
+        self.assertEqual(list(data)[-1], self.this_month.strftime('%Y-%m'))
+        self.assertEqual(data[self.this_month.strftime('%Y-%m')], {'revenue': 350.0, 'bookings': 2})
+
+    def test_rebuild_matches_incremental_rollups(self):
+        self.book(self.cars[0], 100)
+        self.book(self.cars[0], 50)
+        self.book(self.cars[1], 75)
+        incremental = self.rollups()
+        RevenueRollup.objects.all().delete()
+        self.assertEqual(rebuild_revenue_rollups(), 4)
+        self.assertEqual(self.rollups(), incremental)
+
+        # Deleting a car takes its rollups with it
+        self.cars[1].delete()
+        self.assertFalse(RevenueRollup.objects.filter(car_id=self.cars[1].id).exists())
+
+    def test_breakdown_by_brand(self):
+        self.book(self.cars[0], 100)
+        self.book(self.cars[1], 50)
+        self.book(self.cars[2], 75)
+        today = timezone.localdate()
+        response = self.client.get('/api/admin/revenue/breakdown/', {
+            'start': today.isoformat(), 'end': today.isoformat(), 'period': 'day', 'by': 'brand',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row['brand'], row['revenue'], row['bookings']) for row in response.data],
+            [(self.cars[0].brand_id, 150.0, 2), (self.cars[2].brand_id, 75.0, 1)],
+        )
+        response = self.client.get('/api/admin/revenue/breakdown/', {'start': today.isoformat(), 'end': today.isoformat(), 'by': 'model'})
+        self.assertEqual(response.status_code, 400)
+
+
+class FleetImportTests(APITestCase):
+    CSV = (
+        'name,brand,year,price_per_day,car_type,description,transmission,fuel_type,image,features,images,horsepower\n'
+        'Roadster,Tesla,2025,250,Sedan,Electric roadster,Automatic,Electric,cars/roadster,GPS;Autopilot,cars/r1;cars/r2,\n'
+        'Model Y,Tesla,2024,120,SUV,Family SUV,Automatic,Electric,,GPS,,384\n'
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser('admin', password='password123')
+        self.client.force_authenticate(self.admin)
+        self.tesla = Brand.objects.create(name='Tesla', image='brands/tesla')
+        self.gps = Feature.objects.create(name='GPS')
+
+    def upload(self, content, name='fleet.csv', **params):
+        return self.client.post(
+            '/api/admin/cars/import/' + ('?dry_run=true' if params.get('dry_run') else ''),
+            {'file': SimpleUploadedFile(name, content.encode())}, format='multipart',
+        )
+
+    def record(self, name, **fields):
+        return {
+            'name': name, 'brand': 'Tesla', 'year': 2024, 'price_per_day': '100', 'car_type': 'Sedan',
+            'description': 'Imported', 'transmission': 'Automatic', 'fuel_type': 'Electric', **fields,
+        }
+
+    def test_csv_import(self):
+        self.assertEqual(self.client.get('/api/cars/').data['count'], 0)
+        response = self.upload(self.CSV)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {'dry_run': False, 'cars': 2, 'features': 3, 'images': 2, 'new_features': 1})
+
+        roadster = Car.objects.get(name='Roadster')
+        self.assertEqual(roadster.brand, self.tesla)
+        self.assertEqual(sorted(roadster.features.values_list('name', flat=True)), ['Autopilot', 'GPS'])
+        self.assertEqual(Feature.objects.filter(name='GPS').count(), 1)
+        self.assertIn('card', roadster.image_urls)
+        self.assertTrue(all('card' in image.image_urls for image in roadster.images.all()))
+        self.assertIsNone(roadster.horsepower)
+        self.assertEqual(Car.objects.get(name='Model Y').horsepower, 384)
+
+        # The cached catalog and the search index see the new cars
+        self.assertEqual(self.client.get('/api/cars/').data['count'], 2)
+        self.assertEqual([car['name'] for car in self.client.get('/api/cars/', {'q': 'roadster'}).data['results']], ['Roadster'])
+
+    def test_queries_do_not_grow_with_the_file(self):
+        def queries(count, offset):
+            records = [self.record(f'Car {offset + i}', features=['GPS', 'Heated seats'], images=['cars/a']) for i in range(count)]
+            with CaptureQueriesContext(connection) as captured:
+                import_fleet(records)
+            return len(captured)
+
+        queries(1, 0)  # Creates the new feature
+        self.assertEqual(queries(2, 100), queries(40, 200))
+
+    def test_invalid_rows_write_nothing(self):
+        response = self.client.post('/api/admin/cars/import/', [
+            self.record('Good'),
+            self.record('Bad', year='soon', car_type='Van'),
+            self.record('Unbranded', brand='Rivian'),
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['row'] for error in response.data['rows']], ['2', '3'])
+        self.assertEqual(set(response.data['rows'][0]['errors']), {'year', 'car_type'})
+        self.assertIn('Unknown brand', str(response.data['rows'][1]['errors']['brand']))
+
+        self.assertEqual(self.upload('[]', name='fleet.xml').status_code, 400)
+        self.assertFalse(Car.objects.exists())
+
+    def test_dry_run_rolls_back(self):
+        response = self.upload(self.CSV, dry_run=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['dry_run'], response.data['cars']), (True, 2))
+        self.assertFalse(Car.objects.exists())
+        self.assertFalse(Feature.objects.filter(name='Autopilot').exists())
 
-# Create your tests here.
@@ -21,11 +21,18 @@ urlpatterns = [
     path('payments/create-checkout-session/', payments.create_checkout_session, name='create_checkout_session'),
     path('payments/verify/', payments.verify_payment, name='verify_payment'),
     path('payments/public-key/', payments.get_stripe_public_key, name='stripe_public_key'),
+    path('payments/status/', payments.payment_status, name='payment_status'),
+    path('payments/webhook/', payments.stripe_webhook, name='stripe_webhook'),
     
     # Admin endpoints 
     path('admin/stats/', admin_views.admin_stats, name='admin_stats'),
-    path('admin/bookings/', admin_views.admin_all_bookings, name='admin_all_bookings'),
+    path('admin/bookings/', admin_views.AdminBookingList.as_view(), name='admin_all_bookings'),
     path('admin/bookings/<int:booking_id>/status/', admin_views.admin_update_booking_status, name='admin_update_booking_status'),
     path('admin/users/', admin_views.admin_all_users, name='admin_all_users'),
     path('admin/revenue/', admin_views.admin_revenue_chart, name='admin_revenue_chart'),
+    path('admin/revenue/breakdown/', admin_views.admin_revenue_breakdown, name='admin_revenue_breakdown'),
+    path('admin/export/<str:kind>/', admin_views.admin_export, name='admin_export'),
+    path('admin/cars/import/', admin_views.admin_import_fleet, name='admin_import_fleet'),
+    path('admin/fleet-calendar/', admin_views.admin_fleet_calendar, name='admin_fleet_calendar'),
+    path('admin/stripe-latency/', admin_views.admin_stripe_latency, name='admin_stripe_latency'),
 ]
\ No newline at end of file
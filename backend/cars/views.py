@@ -5,27 +5,132 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly, AllowAny
-from django.db.models import Q
+from django.db import transaction
 from django.core.mail import send_mail
 from django.conf import settings
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.shortcuts import get_object_or_404
 from datetime import datetime
-from .serializers import CarSerializer, FeatureSerializer, BrandSerializer, BookingSerializer, ReviewSerializer, WishlistSerializer, ContactMessageSerializer, NewsletterSerializer
+from .serializers import query_param_set, CarSerializer, CarListSerializer, FeatureSerializer, BrandSerializer, BookingSerializer, ReviewSerializer, WishlistSerializer, ContactMessageSerializer, NewsletterSerializer
 from .models import Car, Feature, Brand, Booking, Review, Wishlist, ContactMessage, Newsletter
 from .emails import send_booking_confirmation_email, send_booking_cancellation_email 
+from .ratings import apply_rating_delta
+from .bookings import save_booking
+from .queries import catalog_cars, with_catalog_car, CAR_PREFETCH_RELATED
+from .filters import filter_cars, order_cars, KEYSET_ORDERING_FIELDS
+from .facets import get_facets
+from .search import search_cars
+from .pagination import KeysetPagination
+from .availability import available_cars, overlapping_bookings, parse_date_range
+from .booking_calendar import booked_intervals, parse_month, month_range, next_month, MAX_CALENDAR_MONTHS
+from . import availability_index
+from .catalog import CatalogResponseMixin, catalog_conditional, get_catalog_stamp
+from .response_cache import cached_response
 import logging
 logger = logging.getLogger(__name__)
 
 
-class CarViewSet(viewsets.ModelViewSet):
-    queryset = Car.objects.all()
+class CarViewSet(CatalogResponseMixin, viewsets.ModelViewSet):
+    queryset = catalog_cars()
     serializer_class = CarSerializer
+    pagination_class = KeysetPagination
+    cache_scopes = {
+        'list': ('cars',),
+        'retrieve': ('car-detail', 'car:{pk}'),
+        'featured': ('cars',),
+    }
+    # Availability follows bookings, not the catalog stamp
+    volatile_params = ('available_from', 'available_to')
+    
+    def get_serializer_class(self):
+        if self.action in ('list', 'featured', 'available'):
+            return CarListSerializer
+        return CarSerializer
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'featured', 'available'):
+            # The list shape only renders relations the client expanded
+            expand = query_param_set(self.request, 'expand')
+            queryset = catalog_cars(
+                queryset.prefetch_related(None),
+                prefetch=[name for name in CAR_PREFETCH_RELATED if name in expand],
+            )
+            # GET /api/cars/?car_type=SUV&min_price=50&max_price=200&ordering=-year
+            params = self.request.query_params
+            queryset = filter_cars(queryset, params)
+            # GET /api/cars/?available_from=2026-06-01&available_to=2026-06-05
+            pickup, return_date = parse_date_range(params, required=self.action == 'available')
+            if pickup:
+                queryset = available_cars(queryset, pickup, return_date)
+            if params.get('q'):
+                # GET /api/cars/?q=electric+bmw - ranked by relevance unless ?ordering= is given
+                queryset = search_cars(queryset, params['q'])
+            queryset = order_cars(queryset, params)
+        return queryset
+    
+    def get_keyset_ordering(self):
+        """Keyset for ?pagination=cursor, matching the ordering get_queryset applies"""
+        params = self.request.query_params
+        ordering = params.get('ordering')
+        if not ordering:
+            # Relevance-ranked search results can't be keyset-paginated
+            return None if params.get('q') else ('-featured', '-id')
+        if ordering.removeprefix('-') not in KEYSET_ORDERING_FIELDS:
+            return None
+        return (ordering, '-id' if ordering.startswith('-') else 'id')
     
     @action(detail=False, methods=['get'])
     def featured(self, request):
-        featured = Car.objects.filter(featured=True)
+        return self.catalog_response('featured', self.list_featured, request)
+    
+    def list_featured(self, request):
+        featured = self.get_queryset().filter(featured=True)
         serializer = self.get_serializer(featured, many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'])
+    def available(self, request):
+        """Every car free for the whole date range, with the usual filters and pagination"""
+        # GET /api/cars/available/?available_from=2026-06-01&available_to=2026-06-05&car_type=SUV
+        return self.list(request)
+    
+    @action(detail=False, methods=['get'])
+    @method_decorator(catalog_conditional)
+    def facets(self, request):
+        """Counts per filter option for the current filter set"""
+        # GET /api/cars/facets/?fuel_type=Electric&max_price=200
+        return Response(get_facets(request.query_params, get_catalog_stamp(request).version))
+    
+    @action(detail=True, methods=['get'])
+    def calendar(self, request, pk=None):
+        """Merged booked intervals for the date picker, end dates exclusive"""
+        # GET /api/cars/1/calendar/?month=2026-06&months=3
+        car = get_object_or_404(Car.objects.only('id'), pk=pk)
+        month = request.query_params.get('month')
+        start = parse_month(month) if month else timezone.localdate().replace(day=1)
+        try:
+            months = int(request.query_params.get('months', 1))
+        except ValueError:
+            months = 0
+        if not 1 <= months <= MAX_CALENDAR_MONTHS:
+            return Response({
+                'error': f'months must be between 1 and {MAX_CALENDAR_MONTHS}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        end = next_month(month_range(start, months)[-1])
+        if availability_index.index_enabled():
+            intervals = availability_index.booked_intervals(car.id, start, end)
+        else:
+            intervals = booked_intervals(car.id, start, months)
+        return Response({
+            'car_id': car.id,
+            'start': start,
+            'end': end,
+            'booked': [{'start': booked_start, 'end': booked_end} for booked_start, booked_end in intervals],
+        })
+    
     @action(detail=True, methods=['post'])
     def check_availability(self, request, pk=None):
         """Check if car is available for given dates"""
@@ -50,27 +155,24 @@ class CarViewSet(viewsets.ModelViewSet):
                     'error': 'Return date must be after pickup date'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Check for overlapping bookings
-            # A booking overlaps if:
-            # 1. It starts before our return date AND
-            # 2. It ends after our pickup date
-            overlapping_bookings = Booking.objects.filter(
-                car=car,
-                status__in=['pending', 'confirmed']  # Only active bookings
-            ).filter(
-                Q(pickup_date__lt=return_dt) & Q(return_date__gt=pickup)
-            )
+            # Check for overlapping active bookings
+            conflicts = overlapping_bookings(pickup, return_dt).filter(car=car)
             
-            is_available = not overlapping_bookings.exists()
+            # The index can only rule conflicts out; a hit is confirmed in SQL,
+            # so a stale index never reports a booking that isn't there
+            if availability_index.index_enabled() and car.id not in availability_index.booked_car_ids(
+                [car.id], pickup, return_dt
+            ):
+                conflicting = None
+            else:
+                conflicting = conflicts.first()
             
-            if is_available:
+            if conflicting is None:
                 return Response({
                     'available': True,
                     'message': 'Car is available for selected dates'
                 })
             else:
-                # Get conflicting booking details
-                conflicting = overlapping_bookings.first()
                 return Response({
                     'available': False,
                     'message': 'Car is not available for selected dates',
@@ -88,22 +190,27 @@ class CarViewSet(viewsets.ModelViewSet):
     
         
 
-class FeatureViewSet(viewsets.ModelViewSet):
+class FeatureViewSet(CatalogResponseMixin, viewsets.ModelViewSet):
     queryset = Feature.objects.all()
     serializer_class = FeatureSerializer
+    cache_scopes = {'list': ('features',)}
     
-class BrandViewSet(viewsets.ModelViewSet):
+class BrandViewSet(CatalogResponseMixin, viewsets.ModelViewSet):
     queryset = Brand.objects.all()
     serializer_class = BrandSerializer
+    cache_scopes = {'list': ('brands',)}
 
     # GET /api/brands/by_brand/?brand_id=1
     @action(detail=False, methods=['get'])
+    @method_decorator(catalog_conditional)
+    @method_decorator(cached_response('cars'))
     def by_brand(self, request):
         brand_id = request.query_params.get('brand_id')
 
         if brand_id:
-            cars = Car.objects.filter(brand_id=brand_id)
-            serializer = CarSerializer(cars, many=True)
+            expand = query_param_set(request, 'expand')
+            cars = catalog_cars(prefetch=[name for name in CAR_PREFETCH_RELATED if name in expand]).filter(brand_id=brand_id)
+            serializer = CarListSerializer(cars, many=True, context={'request': request})
             return Response(serializer.data)
 
         return Response({'error': 'brand_id required'}, status=400)
@@ -111,30 +218,39 @@ class BrandViewSet(viewsets.ModelViewSet):
 class BookingViewSet(viewsets.ModelViewSet):
     serializer_class = BookingSerializer
     permission_classes = [IsAuthenticated]  # Must be logged in
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created_at', '-id')
     
     def get_queryset(self):
         # Users can only see their own bookings
-        return Booking.objects.filter(user=self.request.user)
+        return with_catalog_car(Booking.objects.filter(user=self.request.user).select_related('user'))
     
     def perform_create(self, serializer):
-        booking = serializer.save(user=self.request.user)
-        
-        # Send confirmation email
-        if booking.user.email:
-            send_booking_confirmation_email(booking)
+        # The email is queued in the booking's transaction
+        with transaction.atomic():
+            # 409 if another booking got the dates first
+            booking = save_booking(serializer, user=self.request.user)
             
-    def partial_update(self, request, *args, **kwargs):
-        booking = self.get_object()
-        old_status = booking.status
-        
-        # Update booking
-        response = super().partial_update(request, *args, **kwargs)
-        
-        # If status changed to cancelled, send cancellation email
-        new_status = request.data.get('status')
-        if old_status != 'cancelled' and new_status == 'cancelled':
+            # Send confirmation email
             if booking.user.email:
-                send_booking_cancellation_email(booking)
+                send_booking_confirmation_email(booking)
+    
+    def perform_update(self, serializer):
+        save_booking(serializer)
+            
+    def partial_update(self, request, *args, **kwargs):
+        with transaction.atomic():
+            booking = self.get_object()
+            old_status = booking.status
+            
+            # Update booking
+            response = super().partial_update(request, *args, **kwargs)
+            
+            # If status changed to cancelled, send cancellation email
+            new_status = request.data.get('status')
+            if old_status != 'cancelled' and new_status == 'cancelled':
+                if booking.user.email:
+                    send_booking_cancellation_email(booking)
         
         return response
     
@@ -143,6 +259,8 @@ class BookingViewSet(viewsets.ModelViewSet):
 class ReviewViewSet(viewsets.ModelViewSet):
     serializer_class = ReviewSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]  # Anyone can read, only authenticated can write
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created_at', '-id')
     
     def get_queryset(self):
         # Filter reviews by car_id if provided
@@ -152,30 +270,46 @@ class ReviewViewSet(viewsets.ModelViewSet):
         return Review.objects.all()
     
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        with transaction.atomic():
+            review = serializer.save(user=self.request.user)
+            apply_rating_delta(review.car_id, review.rating, 1)
     
     def perform_update(self, serializer):
         # Only allow users to update their own reviews
         if serializer.instance.user != self.request.user:
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("You can only edit your own reviews")
-        serializer.save()
+        old_car_id = serializer.instance.car_id
+        old_rating = serializer.instance.rating
+        
+        with transaction.atomic():
+            review = serializer.save()
+            if review.car_id != old_car_id:
+                # Review moved to another car
+                apply_rating_delta(old_car_id, -old_rating, -1)
+                apply_rating_delta(review.car_id, review.rating, 1)
+            elif review.rating != old_rating:
+                apply_rating_delta(review.car_id, review.rating - old_rating, 0)
     
     def perform_destroy(self, instance):
         # Only allow users to delete their own reviews
         if instance.user != self.request.user:
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("You can only delete your own reviews")
-        instance.delete()
+        with transaction.atomic():
+            instance.delete()
+            apply_rating_delta(instance.car_id, -instance.rating, -1)
         
         
 class WishlistViewSet(viewsets.ModelViewSet):
     serializer_class = WishlistSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created_at', '-id')
     
     def get_queryset(self):
         # Users can only see their own wishlist
-        return Wishlist.objects.filter(user=self.request.user)
+        return with_catalog_car(Wishlist.objects.filter(user=self.request.user))
     
     def perform_create(self, serializer):
         # Automatically set the user
@@ -1,4 +1,5 @@
 from django.shortcuts import render
+from django.db import transaction
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
@@ -13,11 +14,12 @@ def register(request):
     serializer = UserSerializer(data=request.data)
     
     if serializer.is_valid():
-        user = serializer.save()
-        
-        # Send welcome email
-        if user.email:
-            send_welcome_email(user)
+        with transaction.atomic():
+            user = serializer.save()
+            
+            # Send welcome email
+            if user.email:
+                send_welcome_email(user)
         
         return Response({
             'message': 'User created successfully. Welcome email sent!',
@@ -38,7 +38,7 @@ const AdminDashboard = () => {
             setStats(statsResponse.data);
 
             // Fetch recent bookings
-            const bookingsResponse = await adminApi.getAllBookings({ limit: 10 });
+            const bookingsResponse = await adminApi.getAllBookings({ page_size: 10 });
             const bookingsData = bookingsResponse.data.results || bookingsResponse.data;
             setRecentBookings(bookingsData.slice(0, 10));
 
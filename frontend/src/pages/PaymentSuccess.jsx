@@ -22,6 +22,22 @@ const PaymentSuccess = () => {
             }
 
             try {
+                // The Stripe webhook records the payment; wait for it to land
+                for (let attempt = 0; attempt < 10; attempt++) {
+                    const response = await paymentApi.getPaymentStatus(sessionId);
+                    const { payment_status } = response.data.booking;
+                    if (payment_status === 'succeeded') {
+                        setBooking(response.data.booking);
+                        setLoading(false);
+                        return;
+                    }
+                    if (payment_status === 'failed') {
+                        throw new Error('Payment failed');
+                    }
+                    await new Promise((resolve) => setTimeout(resolve, 1500));
+                }
+
+                // Webhook delayed or not configured: ask Stripe directly
                 const response = await paymentApi.verifyPayment(sessionId);
                 setBooking(response.data.booking);
                 setLoading(false);
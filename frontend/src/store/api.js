@@ -25,10 +25,11 @@ api.interceptors.request.use(
 );
 
 export const carApi = {
-    getCars: () => api.get("/cars/"),
+    // List endpoints return a compact car shape; features are needed for comparison
+    getCars: () => api.get("/cars/", { params: { expand: "features" } }),
     getCarById: (id) => api.get(`/cars/${id}/`),
     getFeaturedCars: () => api.get("/cars/featured/"),
-    getCarsByBrand: (brandId) => api.get(`/brands/by_brand/?brand_id=${brandId}`),
+    getCarsByBrand: (brandId) => api.get("/brands/by_brand/", { params: { brand_id: brandId, expand: "features" } }),
     getBrand: () => api.get("/brands/"),
     checkAvailability: (carId, pickupDate, returnDate) => 
         api.post(`/cars/${carId}/check_availability/`, {
@@ -65,6 +66,8 @@ export const paymentApi = {
         api.post("/payments/create-checkout-session/", { booking_id: bookingId, frontend_url: frontendUrl }),
     verifyPayment: (sessionId) => 
         api.post("/payments/verify/", { session_id: sessionId }),
+    getPaymentStatus: (sessionId) => 
+        api.get("/payments/status/", { params: { session_id: sessionId } }),
     getPublicKey: () => 
         api.get("/payments/public-key/"),
 };